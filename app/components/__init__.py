@@ -2,11 +2,20 @@
 Components package for ATK Classifier application.
 """
 from app.components.image_uploader import ImageUploader, UploadResult
-from app.components.predictor import PredictionEngine, display_results
+from app.components.predictor import (
+    PredictionEngine,
+    get_prediction_engine,
+    predict_image,
+    prewarm_prediction_engine,
+    display_results
+)
 
 __all__ = [
     "ImageUploader",
     "UploadResult", 
     "PredictionEngine",
+    "get_prediction_engine",
+    "predict_image",
+    "prewarm_prediction_engine",
     "display_results"
 ]
@@ -3,15 +3,29 @@ Predictor component for ATK Classifier.
 Provides prediction engine with caching and result display.
 Enhanced dengan visualisasi yang menarik.
 """
-from typing import Optional
+from typing import Optional, TYPE_CHECKING
+import threading
+
 from PIL import Image
 
 import streamlit as st
 
-from models.inference import InferencePipeline
-from models.cnn_model import PredictionResult
 from app.config import settings
 
+# models.inference/cnn_model import TensorFlow; only load them when the
+# pipeline is first built so the page can render before TF is imported
+if TYPE_CHECKING:
+    from models.inference import InferencePipeline
+    from models.cnn_model import PredictionResult
+
+
+# Emoji per kelas, dibuat sekali saat import
+_EMOJI_MAP = {
+    "eraser": "🧹",
+    "kertas": "📄",
+    "pensil": "✏️"
+}
+
 
 class PredictionEngine:
     """
@@ -19,32 +33,46 @@ class PredictionEngine:
     Uses st.cache_resource for model caching.
     """
     
-    def __init__(self):
-        """Initialize prediction engine."""
-        self._pipeline = self._get_cached_pipeline()
+    def __init__(self, model_version: float = 0.0):
+        """
+        Initialize prediction engine.
+        
+        Args:
+            model_version: Model file mtime the cached pipeline is keyed on
+        """
+        self._pipeline = self._get_cached_pipeline(model_version)
+        # Mode demo tidak berubah untuk satu versi model, cukup dicek sekali
+        self._is_demo = self._pipeline.is_demo_mode()
     
     @staticmethod
-    @st.cache_resource
-    def _get_cached_pipeline() -> InferencePipeline:
+    @st.cache_resource(show_spinner=False, max_entries=1)
+    def _get_cached_pipeline(model_version: float) -> "InferencePipeline":
         """
         Get cached inference pipeline.
-        Uses st.cache_resource to cache the model across sessions.
+        Uses st.cache_resource to cache the model across sessions; a new
+        model_version (model file mtime) reloads it.
         
         Returns:
             Cached InferencePipeline instance
         """
+        from models.inference import InferencePipeline
+        
         return InferencePipeline(
             model_path=str(settings.MODEL_PATH),
             input_size=settings.INPUT_SIZE,
             class_names=settings.CLASS_NAMES,
-            low_confidence_threshold=settings.LOW_CONFIDENCE_THRESHOLD
+            low_confidence_threshold=settings.LOW_CONFIDENCE_THRESHOLD,
+            use_tflite=settings.USE_TFLITE,
+            use_onnx=settings.USE_ONNX,
+            calibration_dir=str(settings.DATASET_DIR),
+            max_batch_size=settings.MAX_BATCH_SIZE
         )
     
     def is_demo_mode(self) -> bool:
         """Check if running in demo mode."""
-        return self._pipeline.is_demo_mode()
+        return self._is_demo
     
-    def predict(self, image: Image.Image, top_k: int = None) -> PredictionResult:
+    def predict(self, image: Image.Image, top_k: int = None) -> "PredictionResult":
         """
         Run prediction on an image.
         
@@ -59,6 +87,87 @@ class PredictionEngine:
         return self._pipeline.predict(image, top_k=top_k)
 
 
+def _model_version() -> float:
+    """Modification time of the model file (0.0 without a model), used as a cache key."""
+    try:
+        return settings.MODEL_PATH.stat().st_mtime
+    except OSError:
+        return 0.0
+
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def _get_engine(model_version: float) -> PredictionEngine:
+    """Prediction engine cached per model version."""
+    return PredictionEngine(model_version)
+
+
+def get_prediction_engine(model_version: Optional[float] = None) -> PredictionEngine:
+    """
+    Get the shared prediction engine.
+    Cached with st.cache_resource so every page and rerun reuses one instance,
+    keyed on the model file mtime so a replaced model is loaded again.
+    
+    Args:
+        model_version: Model file mtime (default: read from MODEL_PATH)
+    
+    Returns:
+        Cached PredictionEngine instance
+    """
+    if model_version is None:
+        model_version = _model_version()
+    return _get_engine(model_version)
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _predict_cached(
+    image_bytes: bytes,
+    model_version: float,
+    top_k: int,
+    _image: Image.Image
+) -> "PredictionResult":
+    """
+    Prediction cached per image content and model version. _image (the
+    already-decoded image) is excluded from the cache key.
+    """
+    return get_prediction_engine(model_version).predict(_image, top_k=top_k)
+
+
+def predict_image(image: Image.Image, image_bytes: bytes, top_k: int = None) -> "PredictionResult":
+    """
+    Run prediction, reusing the cached result when the same image is shown
+    again (e.g. on reruns caused by sidebar or other widget changes).
+    
+    Args:
+        image: Decoded PIL Image to classify
+        image_bytes: Raw file bytes of the image (cache key)
+        top_k: Number of top predictions (default from settings)
+        
+    Returns:
+        PredictionResult with classification results
+    """
+    top_k = top_k or settings.TOP_K_PREDICTIONS
+    return _predict_cached(image_bytes, _model_version(), top_k, image)
+
+
+_prewarm_lock = threading.Lock()
+_prewarm_started = False
+
+
+def prewarm_prediction_engine() -> None:
+    """
+    Start loading the shared prediction engine in a background thread.
+    Runs once per process; later get_prediction_engine() calls wait on the
+    same cache entry instead of loading the model again.
+    """
+    global _prewarm_started
+    with _prewarm_lock:
+        if _prewarm_started:
+            return
+        _prewarm_started = True
+    
+    threading.Thread(target=get_prediction_engine, daemon=True).start()
+
+
 def get_confidence_color(percentage: float) -> str:
     """Get color based on confidence level."""
     if percentage >= 80:
@@ -71,15 +180,10 @@ def get_confidence_color(percentage: float) -> str:
 
 def get_emoji_for_class(class_name: str) -> str:
     """Get emoji for predicted class."""
-    emoji_map = {
-        "eraser": "🧹",
-        "kertas": "📄",
-        "pensil": "✏️"
-    }
-    return emoji_map.get(class_name.lower(), "🏷️")
+    return _EMOJI_MAP.get(class_name.lower(), "🏷️")
 
 
-def display_results(result: PredictionResult) -> None:
+def display_results(result: "PredictionResult") -> None:
     """
     Display prediction results in Streamlit dengan visualisasi menarik.
     
@@ -148,7 +252,7 @@ def display_results(result: PredictionResult) -> None:
         """, unsafe_allow_html=True)
 
 
-def display_results_compact(result: PredictionResult) -> None:
+def display_results_compact(result: "PredictionResult") -> None:
     """
     Display prediction results in a compact format.
     
@@ -188,7 +292,7 @@ def display_results_compact(result: PredictionResult) -> None:
         st.caption("⚠️ Confidence rendah - coba gambar yang lebih jelas")
 
 
-def display_results_card(result: PredictionResult) -> None:
+def display_results_card(result: "PredictionResult") -> None:
     """
     Display prediction results as a beautiful card.
     
@@ -72,6 +72,11 @@ class Settings:
     TOP_K_PREDICTIONS: int = 3
     LOW_CONFIDENCE_THRESHOLD: float = 0.5
     
+    # Inference Backend
+    USE_TFLITE: bool = False  # Quantize to .tflite (int8, calibrated on DATASET_DIR)
+    USE_ONNX: bool = False  # Export to .onnx and run with ONNX Runtime (needs tf2onnx)
+    MAX_BATCH_SIZE: int = 1  # >1 batches concurrent predictions from multiple sessions
+    
     # Demo Mode
     DEMO_MODE_MESSAGE: str = "Running in demo mode - predictions are simulated"
 
@@ -7,13 +7,32 @@ from PIL import Image
 from pathlib import Path
 
 from app.config import settings
-from app.components.predictor import PredictionEngine
+from app.components.predictor import (
+    predict_image,
+    prewarm_prediction_engine,
+    get_emoji_for_class
+)
+
+
+# Batas persentase keyakinan -> CSS class (urut menurun)
+_CONFIDENCE_CLASSES = ((80, "high"), (50, "medium"))
+
+# Template HTML satu baris bar prediksi (expert mode)
+_PREDICTION_BAR_ROW = (
+    '<div style="display: flex; align-items: center; gap: 8px; margin: 6px 0;">'
+    '<div style="width: 20%;">{name}</div>'
+    '<div style="flex: 1; background: #E2E8F0; border-radius: 4px; height: 10px; overflow: hidden;">'
+    '<div style="width: {pct:.1f}%; height: 100%; background: #1a73e8; border-radius: 4px;"></div>'
+    '</div>'
+    '<div style="width: 15%; text-align: right;">{pct:.1f}%</div>'
+    '</div>'
+)
 
 
 # Page configuration - HARUS di baris pertama
 st.set_page_config(
-    page_title="CogniDesk - AI Stationery Detector",
-    page_icon="🧠",
+    page_title=f"{settings.APP_TITLE} - AI Stationery Detector",
+    page_icon=settings.APP_ICON,
     layout="wide",
     initial_sidebar_state="expanded"
 )
@@ -242,12 +261,6 @@ def render_sidebar():
             """)
 
 
-@st.cache_resource
-def get_prediction_engine():
-    """Get cached prediction engine."""
-    return PredictionEngine()
-
-
 def init_session_state():
     """Initialize session state variables."""
     if "current_image" not in st.session_state:
@@ -256,12 +269,15 @@ def init_session_state():
         st.session_state.image_source = None
     if "sample_clicked" not in st.session_state:
         st.session_state.sample_clicked = None
+    if "current_image_bytes" not in st.session_state:
+        st.session_state.current_image_bytes = None
 
 
 def set_sample_image(sample_key: str, filepath: Path, label: str):
     """Set sample image to session state and trigger rerun."""
     img = Image.open(filepath)
     st.session_state.current_image = img
+    st.session_state.current_image_bytes = filepath.read_bytes()
     st.session_state.image_source = f"Sample: {label}"
     st.session_state.sample_clicked = sample_key
 
@@ -269,6 +285,7 @@ def set_sample_image(sample_key: str, filepath: Path, label: str):
 def clear_current_image():
     """Clear current image from session state."""
     st.session_state.current_image = None
+    st.session_state.current_image_bytes = None
     st.session_state.image_source = None
     st.session_state.sample_clicked = None
 
@@ -285,18 +302,11 @@ def render_main_header():
     st.markdown("---")
 
 
-def get_emoji_for_class(class_name: str) -> str:
-    """Get emoji for predicted class."""
-    emoji_map = {"eraser": "🧹", "kertas": "📄", "pensil": "✏️"}
-    return emoji_map.get(class_name.lower(), "🏷️")
-
-
 def get_confidence_class(percentage: float) -> str:
     """Get CSS class based on confidence level."""
-    if percentage >= 80:
-        return "high"
-    elif percentage >= 50:
-        return "medium"
+    for threshold, css_class in _CONFIDENCE_CLASSES:
+        if percentage >= threshold:
+            return css_class
     return "low"
 
 
@@ -312,27 +322,28 @@ def render_analysis_result(result):
     # Expert Mode Content
     if user_mode == "expert":
         st.markdown("### 📊 Detailed Analysis")
-        
-        for pred in result.top_predictions:
-            col_name, col_bar, col_val = st.columns([2, 6, 2])
-            with col_name:
-                st.write(pred['class'].title())
-            with col_bar:
-                st.progress(pred["confidence"])
-            with col_val:
-                st.write(f"{pred['percentage']:.1f}%")
-        
+
+        # Satu blok HTML untuk semua kelas (satu pesan, bukan widget per kelas)
+        bars_html = "".join(
+            _PREDICTION_BAR_ROW.format(name=pred["class"].title(), pct=pred["percentage"])
+            for pred in result.top_predictions
+        )
+        st.markdown(bars_html, unsafe_allow_html=True)
+
         with st.expander("🔍 Raw JSON Data"):
             st.json(result.top_predictions)
 
 
-def render_twin_frames(image: Image.Image, source_name: str):
-    """Render twin frames layout - Image & Analysis side by side dengan ukuran tetap."""
-    engine = get_prediction_engine()
+def render_twin_frames(image: Image.Image, source_name: str, image_bytes: bytes):
+    """
+    Render twin frames layout - Image & Analysis side by side dengan ukuran tetap.
     
+    Hasil prediksi di-cache per isi gambar (image_bytes) dan versi model, jadi
+    rerun karena interaksi sidebar tidak menjalankan model lagi.
+    """
     # Process prediction
     with st.spinner("Analyzing..."):
-        result = engine.predict(image, top_k=3)
+        result = predict_image(image, image_bytes, top_k=3)
     
     # Demo mode check
     if result.is_demo:
@@ -358,7 +369,8 @@ def render_input_section():
     if st.session_state.sample_clicked and st.session_state.current_image:
         render_twin_frames(
             st.session_state.current_image, 
-            st.session_state.image_source
+            st.session_state.image_source,
+            st.session_state.current_image_bytes
         )
         
         # Button to clear and go back
@@ -378,13 +390,22 @@ def render_input_section():
             key="file_uploader"
         )
         
-        if uploaded_file:
+        if uploaded_file and uploaded_file.size > settings.MAX_UPLOAD_SIZE:
+            # Cek ukuran dari metadata upload, tanpa membaca/decode bytes
+            max_mb = settings.MAX_UPLOAD_SIZE / (1024 * 1024)
+            st.error(f"❌ File terlalu besar. Maksimal {max_mb:.0f}MB.")
+        elif uploaded_file:
             try:
+                # Image.open membaca langsung dari buffer upload; load() memaksa
+                # decode sekali di sini. getvalue() hanya dipakai sebagai kunci cache
+                # prediksi
                 image = Image.open(uploaded_file)
+                image.load()
                 # Store in session state
                 st.session_state.current_image = image
+                st.session_state.current_image_bytes = uploaded_file.getvalue()
                 st.session_state.image_source = uploaded_file.name
-                render_twin_frames(image, uploaded_file.name)
+                render_twin_frames(image, uploaded_file.name, st.session_state.current_image_bytes)
             except Exception:
                 st.error("❌ Format file tidak valid.")
         else:
@@ -403,27 +424,32 @@ def render_input_section():
                 image = Image.open(camera_image)
                 # Store in session state
                 st.session_state.current_image = image
+                st.session_state.current_image_bytes = camera_image.getvalue()
                 st.session_state.image_source = "Camera Capture"
-                render_twin_frames(image, "Camera Capture")
+                render_twin_frames(image, "Camera Capture", st.session_state.current_image_bytes)
         else:
             st.info("Klik checkbox di atas untuk mengaktifkan kamera.")
 
 
 def resize_sample_image(img: Image.Image, target_size: tuple = (200, 150)) -> Image.Image:
-    """Resize sample image ke ukuran tetap dengan padding untuk menjaga aspek rasio."""
+    """
+    Resize sample image ke ukuran tetap dengan padding untuk menjaga aspek rasio.
+    
+    Catatan: img di-resize in-place (tanpa copy), jadi jangan dipakai lagi
+    oleh pemanggil setelah fungsi ini. Kirim gambar baru dari Image.open().
+    """
     # Buat canvas dengan ukuran target dan background putih
     canvas = Image.new("RGB", target_size, (255, 255, 255))
     
-    # Resize image dengan menjaga aspek rasio
-    img_copy = img.copy()
-    img_copy.thumbnail(target_size, Image.Resampling.LANCZOS)
+    # Resize image in-place dengan menjaga aspek rasio
+    img.thumbnail(target_size, Image.Resampling.LANCZOS)
     
     # Hitung posisi untuk center image
-    x = (target_size[0] - img_copy.width) // 2
-    y = (target_size[1] - img_copy.height) // 2
+    x = (target_size[0] - img.width) // 2
+    y = (target_size[1] - img.height) // 2
     
     # Paste image ke canvas
-    canvas.paste(img_copy, (x, y))
+    canvas.paste(img, (x, y))
     
     return canvas
 
@@ -474,6 +500,9 @@ def main():
     # Initialize session state first
     init_session_state()
     
+    # Mulai load model di background selagi UI dirender
+    prewarm_prediction_engine()
+    
     inject_custom_css()
     render_sidebar()
     render_main_header()
@@ -2,13 +2,40 @@
 Download model file from cloud storage.
 Supports Google Drive and direct URLs.
 """
-import os
 import sys
+import shutil
+import subprocess
+import importlib.util
+import hashlib
+import urllib.error
+import urllib.request
 from pathlib import Path
+from typing import Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
 
 MODEL_DIR = Path("models")
 MODEL_FILE = MODEL_DIR / "best_model.keras"
 
+# Sidecar storing the ETag of the last direct-URL download
+ETAG_FILE = MODEL_DIR / "best_model.keras.etag"
+
+# Downloads land here and replace MODEL_FILE only after verification, so a
+# failed update keeps the previous model
+STAGING_FILE = MODEL_DIR / "best_model.keras.new"
+
+# Optional direct download URL (e.g. GitHub Releases asset).
+# When set, it is used instead of Google Drive.
+MODEL_URL = ""
+
+# Optional SHA256 of the model file; when set, it replaces the size check
+MODEL_SHA256 = ""
+
+# Read/write block size for streaming downloads (8 MiB)
+CHUNK_SIZE = 8 * 1024 * 1024
+
+# Number of concurrent HTTP Range requests for direct-URL downloads
+PARALLEL_PARTS = 8
+
 # Google Drive file ID - REPLACE WITH YOUR ACTUAL FILE ID
 # To get file ID: Share file > Copy link > Extract ID from URL
 # Example URL: https://drive.google.com/file/d/1ABC123xyz/view
@@ -19,35 +46,245 @@ GDRIVE_FILE_ID = "1pmZlycIZl6B6EMH1V31NNI29w6128DcV"
 def download_from_gdrive(file_id: str, destination: Path) -> bool:
     """Download file from Google Drive."""
     try:
+        if importlib.util.find_spec("gdown") is None:
+            print("Installing gdown...")
+            subprocess.run(
+                [sys.executable, "-m", "pip", "install", "--quiet", "gdown"],
+                check=True
+            )
         import gdown
         url = f"https://drive.google.com/uc?id={file_id}"
-        gdown.download(url, str(destination), quiet=False)
-        return destination.exists()
-    except ImportError:
-        print("Installing gdown...")
-        os.system(f"{sys.executable} -m pip install gdown")
-        import gdown
-        url = f"https://drive.google.com/uc?id={file_id}"
-        gdown.download(url, str(destination), quiet=False)
+        gdown.download(url, str(destination), quiet=False, resume=True)
         return destination.exists()
     except Exception as e:
         print(f"Error: {e}")
         return False
 
 
+def _range_validator(headers) -> Optional[str]:
+    """
+    Validator usable in If-Range: a strong ETag, else Last-Modified (weak
+    ETags are not allowed there). None if the server sends neither.
+    """
+    etag = headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return headers.get("Last-Modified")
+
+
+def download_from_url(url: str, destination: Path) -> bool:
+    """
+    Download file from a direct URL.
+    Streams in CHUNK_SIZE blocks into a .part file and resumes it with an
+    HTTP Range request if a previous download was interrupted. The .part's
+    validator (ETag/Last-Modified) is stored beside it and sent as If-Range,
+    so a file that changed upstream is downloaded again from the start
+    instead of being spliced onto the old prefix.
+    """
+    part_file = destination.with_name(destination.name + ".part")
+    validator_file = part_file.with_name(part_file.name + ".etag")
+    validator = validator_file.read_text().strip() if validator_file.exists() else None
+    # Without a stored validator the prefix can't be checked: start over
+    offset = part_file.stat().st_size if part_file.exists() and validator else 0
+    
+    request = urllib.request.Request(url)
+    if offset:
+        request.add_header("Range", f"bytes={offset}-")
+        request.add_header("If-Range", validator)
+    
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            # Range ignored, or the file changed upstream (If-Range): start from scratch
+            if offset and response.status != 206:
+                offset = 0
+            if not offset:
+                new_validator = _range_validator(response.headers)
+                if new_validator:
+                    validator_file.write_text(new_validator)
+                else:
+                    validator_file.unlink(missing_ok=True)
+            total = offset + int(response.headers.get("Content-Length", 0))
+            downloaded = offset
+            
+            with open(part_file, "ab" if offset else "wb") as f:
+                while True:
+                    chunk = response.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    downloaded += len(chunk)
+                    if total:
+                        print(f"\r   {downloaded / 1024 / 1024:.1f}/{total / 1024 / 1024:.1f}MB", end="")
+            print()
+    except urllib.error.HTTPError as e:
+        if not (e.code == 416 and offset):
+            print(f"Error: {e}")
+            return False
+        # 416 with "Content-Range: bytes */N": the .part is complete only if it
+        # holds exactly N bytes; otherwise it is stale or oversized
+        content_range = e.headers.get("Content-Range", "")
+        size = content_range.rpartition("/")[2]
+        if not (content_range.startswith("bytes */") and size.isdigit() and int(size) == offset):
+            print("Partial download does not match the remote file, restarting...")
+            part_file.unlink(missing_ok=True)
+            validator_file.unlink(missing_ok=True)
+            return download_from_url(url, destination)
+    except Exception as e:
+        print(f"Error: {e}")
+        return False
+    
+    part_file.replace(destination)
+    validator_file.unlink(missing_ok=True)
+    return destination.exists()
+
+
+def _head(url: str):
+    """Send a HEAD request and return the response headers, or None on failure."""
+    try:
+        request = urllib.request.Request(url, method="HEAD")
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return response.headers
+    except Exception:
+        return None
+
+
+def _get_range_info(url: str) -> Tuple[int, Optional[str]]:
+    """
+    Return (Content-Length, If-Range validator) if the server supports byte
+    ranges, else (0, None).
+    """
+    headers = _head(url)
+    if headers is None or headers.get("Accept-Ranges", "").lower() != "bytes":
+        return 0, None
+    return int(headers.get("Content-Length", 0)), _range_validator(headers)
+
+
+def _get_remote_etag(url: str) -> Optional[str]:
+    """Return the remote ETag (or Last-Modified) validator, if any."""
+    headers = _head(url)
+    if headers is None:
+        return None
+    return headers.get("ETag") or headers.get("Last-Modified")
+
+
+def _download_range(url: str, piece: Path, start: int, end: int, validator: str) -> Path:
+    """Download bytes [start, end] of url into piece, only from the version matching validator."""
+    request = urllib.request.Request(url, headers={"Range": f"bytes={start}-{end}", "If-Range": validator})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        if response.status != 206:
+            raise RuntimeError("Server ignored Range request or the file changed")
+        with open(piece, "wb") as f:
+            shutil.copyfileobj(response, f, CHUNK_SIZE)
+    return piece
+
+
+def download_from_url_parallel(url: str, destination: Path, parts: int = PARALLEL_PARTS) -> bool:
+    """
+    Download file from a direct URL using concurrent HTTP Range requests.
+    Falls back to download_from_url when ranges are unsupported or fail.
+    """
+    total, validator = _get_range_info(url)
+    part_file = destination.with_name(destination.name + ".part")
+    
+    # Small files, no Range support or validator (pieces could come from
+    # different versions), or an interrupted single-stream download
+    if total < parts * CHUNK_SIZE or validator is None or part_file.exists():
+        return download_from_url(url, destination)
+    
+    step = -(-total // parts)  # ceil division
+    ranges = [(start, min(start + step, total) - 1) for start in range(0, total, step)]
+    pieces = [destination.with_name(f"{destination.name}.part{i}") for i in range(len(ranges))]
+    
+    print(f"   Downloading {total / 1024 / 1024:.1f}MB in {len(ranges)} parts...")
+    try:
+        with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+            futures = [
+                executor.submit(_download_range, url, piece, start, end, validator)
+                for piece, (start, end) in zip(pieces, ranges)
+            ]
+            for future in futures:
+                future.result()
+        
+        # Concatenate in order into the .part file, then rename
+        with open(part_file, "wb") as out:
+            for piece in pieces:
+                with open(piece, "rb") as f:
+                    shutil.copyfileobj(f, out, CHUNK_SIZE)
+        part_file.replace(destination)
+    except Exception as e:
+        print(f"Parallel download failed ({e}), falling back to single stream...")
+        return download_from_url(url, destination)
+    finally:
+        for piece in pieces:
+            piece.unlink(missing_ok=True)
+    
+    return destination.exists()
+
+
+def verify_model(path: Path = MODEL_FILE) -> bool:
+    """Check that a model file is complete (SHA256 if configured, else size)."""
+    if not path.exists():
+        return False
+    
+    if MODEL_SHA256:
+        sha256 = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+                sha256.update(block)
+        return sha256.hexdigest() == MODEL_SHA256
+    
+    # Valid model should be > 50MB
+    return path.stat().st_size > 50 * 1024 * 1024
+
+
+def _install_download(downloaded: bool, etag: Optional[str]) -> bool:
+    """Verify STAGING_FILE and move it over MODEL_FILE, then record its ETag."""
+    if not (downloaded and verify_model(STAGING_FILE)):
+        print("❌ Download failed or the file did not verify")
+        STAGING_FILE.unlink(missing_ok=True)
+        return False
+    
+    STAGING_FILE.replace(MODEL_FILE)
+    if etag is not None:
+        ETAG_FILE.write_text(etag)
+    else:
+        ETAG_FILE.unlink(missing_ok=True)
+    return True
+
+
 def download_model() -> bool:
     """Download model file."""
     MODEL_DIR.mkdir(exist_ok=True)
     
-    # Check if model exists and is valid
+    # Compare against upstream with a single HEAD (direct URL only)
+    remote_etag = _get_remote_etag(MODEL_URL) if MODEL_URL else None
+    local_etag = ETAG_FILE.read_text().strip() if ETAG_FILE.exists() else None
+    
+    # Check if model exists and is valid; it stays in place until a verified
+    # replacement has been downloaded
     if MODEL_FILE.exists():
         size_mb = MODEL_FILE.stat().st_size / 1024 / 1024
-        if size_mb > 50:  # Valid model should be > 50MB
+        if not verify_model():
+            print(f"⚠️ Model file invalid ({size_mb:.1f}MB), re-downloading...")
+        elif remote_etag is not None and local_etag is None:
+            # Installed before ETags were recorded: adopt the upstream one
+            ETAG_FILE.write_text(remote_etag)
             print(f"✅ Model exists: {size_mb:.1f}MB")
             return True
+        elif remote_etag is not None and remote_etag != local_etag:
+            print("🔄 Newer model available upstream, re-downloading...")
         else:
-            print(f"⚠️ Model file too small ({size_mb:.1f}MB), re-downloading...")
-            MODEL_FILE.unlink()
+            print(f"✅ Model exists: {size_mb:.1f}MB")
+            return True
+    
+    if MODEL_URL:
+        print("📥 Downloading model from URL...")
+        if _install_download(download_from_url_parallel(MODEL_URL, STAGING_FILE), remote_etag):
+            return True
+        if verify_model():
+            print("⚠️ Update failed, keeping the existing model")
+            return True
+        return False
     
     print("📥 Downloading model from Google Drive...")
     
@@ -59,7 +296,7 @@ def download_model() -> bool:
         print("   4. Replace YOUR_GOOGLE_DRIVE_FILE_ID with actual ID")
         return False
     
-    return download_from_gdrive(GDRIVE_FILE_ID, MODEL_FILE)
+    return _install_download(download_from_gdrive(GDRIVE_FILE_ID, STAGING_FILE), None)
 
 
 if __name__ == "__main__":
@@ -1,13 +1,21 @@
 # Models Package
-from models.preprocessing import ImagePreprocessor, ImageValidator
-from models.cnn_model import ATKClassifier, ModelPredictor, PredictionResult
-from models.inference import InferencePipeline
-
-__all__ = [
-    "ImagePreprocessor",
-    "ImageValidator",
-    "ATKClassifier",
-    "ModelPredictor",
-    "PredictionResult",
-    "InferencePipeline",
-]
+# Exports are resolved lazily (PEP 562) so importing a light submodule such as
+# models.preprocessing does not pull in TensorFlow through cnn_model.
+import importlib
+
+_EXPORTS = {
+    "ImagePreprocessor": "models.preprocessing",
+    "ImageValidator": "models.preprocessing",
+    "ATKClassifier": "models.cnn_model",
+    "ModelPredictor": "models.cnn_model",
+    "PredictionResult": "models.cnn_model",
+    "InferencePipeline": "models.inference",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        return getattr(importlib.import_module(_EXPORTS[name]), name)
+    raise AttributeError(f"module 'models' has no attribute {name!r}")
@@ -2,11 +2,18 @@
 CNN Model module for ATK Classifier.
 Contains model architecture and prediction functionality.
 """
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple, Callable
 from pathlib import Path
 from dataclasses import dataclass, field
+from concurrent.futures import Future
 import random
 import json
+import os
+import queue
+import time
+import threading
+import functools
+import itertools
 
 import numpy as np
 
@@ -19,6 +26,186 @@ try:
 except ImportError:
     TENSORFLOW_AVAILABLE = False
 
+# Optional ONNX Runtime backend for faster CPU inference
+try:
+    import onnxruntime as ort
+    ONNXRUNTIME_AVAILABLE = True
+except ImportError:
+    ONNXRUNTIME_AVAILABLE = False
+
+# Optional orjson for faster metadata parsing; both parsers accept bytes
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+
+def _fold_rescaling(model: Any) -> Any:
+    """
+    Fold a leading Rescaling layer into the first Conv2D of a Sequential model.
+    conv(x * scale) == conv'(x) with kernel' = kernel * scale, because 'same'
+    padding pads with zeros either way; this removes one full pass over the input.
+    
+    Args:
+        model: Loaded Keras model
+        
+    Returns:
+        New model without the Rescaling layer, or the original model if the
+        pattern does not apply (non-Sequential, non-zero offset, ...)
+    """
+    if not isinstance(model, keras.Sequential) or len(model.layers) < 2:
+        return model
+    
+    rescaling, conv = model.layers[0], model.layers[1]
+    if not isinstance(rescaling, layers.Rescaling) or not isinstance(conv, layers.Conv2D):
+        return model
+    if np.any(np.asarray(rescaling.offset) != 0):
+        return model
+    
+    folded = keras.Sequential(
+        [keras.Input(shape=model.input_shape[1:])]
+        + [layer.__class__.from_config(layer.get_config()) for layer in model.layers[1:]]
+    )
+    
+    # Per-channel or scalar scale, broadcast over (kh, kw, in_channels, out_channels)
+    scale = np.reshape(np.asarray(rescaling.scale, dtype=np.float32), (1, 1, -1, 1))
+    kernel, *conv_rest = conv.get_weights()
+    folded.layers[0].set_weights([kernel * scale, *conv_rest])
+    for source, target in zip(model.layers[2:], folded.layers[1:]):
+        target.set_weights(source.get_weights())
+    
+    return folded
+
+
+def _fold_conv_bn_weights(
+    kernel: np.ndarray,
+    bias: np.ndarray,
+    gamma: Any,
+    beta: Any,
+    moving_mean: np.ndarray,
+    moving_variance: np.ndarray,
+    epsilon: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Closed-form fold of BatchNormalization (inference mode) into the preceding
+    convolution. With sigma = sqrt(moving_variance + epsilon):
+    kernel' = kernel * gamma / sigma, bias' = (bias - mean) * gamma / sigma + beta.
+    
+    Returns:
+        Tuple of (folded kernel, folded bias); per-channel factors broadcast
+        over the last (output channel) kernel axis
+    """
+    factor = gamma / np.sqrt(moving_variance + epsilon)
+    return kernel * factor, (bias - moving_mean) * factor + beta
+
+
+def _fold_batchnorm(model: Any) -> Any:
+    """
+    Fold each Conv2D -> BatchNormalization pair of a Sequential model into the
+    Conv2D (see _fold_conv_bn_weights), removing the BN layers from inference.
+    
+    Args:
+        model: Loaded Keras model
+        
+    Returns:
+        New model without the folded BatchNormalization layers, or the original
+        model if there is nothing to fold
+    """
+    if not isinstance(model, keras.Sequential):
+        return model
+    
+    source_layers = model.layers
+    foldable = {
+        i for i in range(len(source_layers) - 1)
+        if isinstance(source_layers[i], layers.Conv2D)
+        and isinstance(source_layers[i + 1], layers.BatchNormalization)
+        and source_layers[i].get_config()['activation'] == 'linear'
+    }
+    if not foldable:
+        return model
+    
+    new_layers, new_weights = [], []
+    i = 0
+    while i < len(source_layers):
+        layer = source_layers[i]
+        if i not in foldable:
+            new_layers.append(layer.__class__.from_config(layer.get_config()))
+            new_weights.append(layer.get_weights())
+            i += 1
+            continue
+        
+        conv, bn = layer, source_layers[i + 1]
+        kernel, *rest = conv.get_weights()
+        bias = rest[0] if rest else np.zeros(kernel.shape[-1], dtype=kernel.dtype)
+        config = conv.get_config()
+        config['use_bias'] = True
+        new_layers.append(conv.__class__.from_config(config))
+        new_weights.append(list(_fold_conv_bn_weights(
+            kernel,
+            bias,
+            np.asarray(bn.gamma) if bn.scale else 1.0,
+            np.asarray(bn.beta) if bn.center else 0.0,
+            np.asarray(bn.moving_mean),
+            np.asarray(bn.moving_variance),
+            bn.epsilon
+        )))
+        i += 2
+    
+    folded = keras.Sequential([keras.Input(shape=model.input_shape[1:])] + new_layers)
+    for layer, weights in zip(new_layers, new_weights):
+        layer.set_weights(weights)
+    
+    return folded
+
+
+def _build_predict_fn(model: Any) -> Any:
+    """
+    Wrap the model's forward pass in a tf.function compiled with XLA
+    (Conv+ReLU, Dense+Softmax fusion). The uint8 -> float32 cast happens inside
+    the function so XLA fuses it with the first (Rescaling-folded) convolution.
+    Falls back to plain graph mode if XLA fails.
+    
+    Args:
+        model: Loaded Keras model
+        
+    Returns:
+        Warmed-up tf.function taking a (batch, H, W, 3) uint8 or float tensor
+    """
+    warmup = tf.zeros((1, *model.input_shape[1:]), tf.uint8)
+    
+    for jit_compile in (True, False):
+        # Traced once per input dtype; reduce_retracing keeps the batch dim dynamic
+        predict_fn = tf.function(
+            lambda images: model(tf.cast(images, tf.float32), training=False),
+            jit_compile=jit_compile,
+            reduce_retracing=True
+        )
+        try:
+            predict_fn(warmup)
+            return predict_fn
+        except Exception as e:
+            if not jit_compile:
+                raise
+            print(f"XLA compilation failed, using graph mode: {e}")
+
+
+@functools.lru_cache(maxsize=4)
+def _load_keras_model(path: str, mtime: float) -> Tuple[Any, Any]:
+    """
+    Load (and fold) a Keras model, shared across ModelPredictor instances.
+    mtime is part of the cache key so a retrained model file is reloaded.
+    
+    Args:
+        path: Absolute path to the model file
+        mtime: Modification time of the model file
+        
+    Returns:
+        Tuple of (Keras model, compiled predict function)
+    """
+    model = _fold_batchnorm(_fold_rescaling(keras.models.load_model(path)))
+    return model, _build_predict_fn(model)
+
 
 @dataclass
 class PredictionResult:
@@ -31,6 +218,141 @@ class PredictionResult:
     is_low_confidence: bool
 
 
+class BatchPredictor:
+    """
+    Coalesces concurrent single-image predictions into one batched model call.
+    A background thread waits up to max_wait_ms for more requests (or until
+    max_batch_size is reached), runs the batch and resolves each Future.
+    With pad_to_max, every batch is zero-padded to max_batch_size so a
+    compiled (XLA) function sees a single input shape. close() stops the
+    worker after the requests already queued.
+    """
+    
+    def __init__(
+        self,
+        predict_fn: Callable[[np.ndarray], np.ndarray],
+        max_batch_size: int = 16,
+        max_wait_ms: float = 5.0,
+        pad_to_max: bool = False
+    ):
+        """
+        Initialize and start the batching worker.
+        
+        Args:
+            predict_fn: Function mapping a (B, H, W, 3) batch to (B, num_classes)
+            max_batch_size: Maximum number of images per model call
+            max_wait_ms: Maximum time to wait for more requests to arrive
+            pad_to_max: Zero-pad every batch to max_batch_size
+        """
+        self._predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.pad_to_max = pad_to_max
+        # None in the queue tells the worker to stop
+        self._queue: "queue.Queue[Optional[Tuple[np.ndarray, Future]]]" = queue.Queue()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+    
+    def submit(self, preprocessed_image: np.ndarray) -> Future:
+        """
+        Queue a (1, H, W, 3) image for prediction.
+        
+        Returns:
+            Future resolving to the probability array for this image
+        """
+        if self._closed:
+            raise RuntimeError("BatchPredictor is closed")
+        future = Future()
+        self._queue.put((preprocessed_image, future))
+        return future
+    
+    def close(self, timeout: Optional[float] = None) -> None:
+        """
+        Stop accepting requests and wait for the worker to finish the ones
+        already queued.
+        
+        Args:
+            timeout: Maximum seconds to wait for the worker (None waits forever)
+        """
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+        self._worker.join(timeout)
+    
+    def _collect(self) -> List[Tuple[np.ndarray, Future]]:
+        """
+        Block for one request, then gather more until full or timed out.
+        Returns an empty list once close() has been called and the queue is drained.
+        """
+        first = self._queue.get()
+        if first is None:
+            return []
+        requests = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(requests) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if request is None:
+                # Run this batch first; the next _collect() sees the stop marker
+                self._queue.put(None)
+                break
+            requests.append(request)
+        return requests
+    
+    def _run(self) -> None:
+        """Worker loop: collect, predict as one batch, dispatch rows."""
+        while True:
+            requests = self._collect()
+            if not requests:
+                return
+            try:
+                batch = np.concatenate([image for image, _ in requests], axis=0)
+                if self.pad_to_max and len(batch) < self.max_batch_size:
+                    padding = np.zeros((self.max_batch_size - len(batch), *batch.shape[1:]), batch.dtype)
+                    batch = np.concatenate([batch, padding], axis=0)
+                outputs = self._predict_fn(batch)
+            except Exception as e:
+                for _, future in requests:
+                    future.set_exception(e)
+                continue
+            
+            for (_, future), output in zip(requests, outputs):
+                future.set_result(output)
+
+
+def conv_block(filters: int, batch_norm: bool = False, **conv_kwargs: Any) -> List[Any]:
+    """
+    Layers of one 3x3 conv block: Conv2D(relu) -> MaxPool, or with batch_norm
+    Conv2D(no bias, redundant before BN) -> BatchNormalization -> ReLU -> MaxPool,
+    the pattern _fold_batchnorm folds at load time.
+    
+    Args:
+        filters: Number of conv filters
+        batch_norm: Add BatchNormalization between conv and activation
+        **conv_kwargs: Extra Conv2D/MaxPooling2D arguments (e.g. data_format)
+        
+    Returns:
+        List of Keras layers
+    """
+    if not batch_norm:
+        return [
+            layers.Conv2D(filters, 3, padding='same', activation='relu', **conv_kwargs),
+            layers.MaxPooling2D(**conv_kwargs)
+        ]
+    return [
+        layers.Conv2D(filters, 3, padding='same', use_bias=False, **conv_kwargs),
+        layers.BatchNormalization(),
+        layers.ReLU(),
+        layers.MaxPooling2D(**conv_kwargs)
+    ]
+
+
 class ATKClassifier:
     """CNN model architecture for ATK classification."""
     
@@ -43,7 +365,10 @@ class ATKClassifier:
         conv3_filters: int = 128,
         dense_units: int = 128,
         dropout_rate: float = 0.5,
-        learning_rate: float = 0.001
+        learning_rate: float = 0.001,
+        mixed_precision: bool = False,
+        batch_norm: bool = False,
+        global_pooling: bool = False
     ) -> Any:
         """
         Build CNN model architecture for ATK classification.
@@ -58,36 +383,40 @@ class ATKClassifier:
             dense_units: Units in dense layer
             dropout_rate: Dropout rate
             learning_rate: Learning rate for optimizer
+            mixed_precision: Compute in float16 with float32 variables. Sets the
+                global Keras policy either way ('mixed_float16' or 'float32'), so
+                one mixed-precision build doesn't leak into later models
+            batch_norm: Conv2D(use_bias=False) -> BatchNormalization -> ReLU blocks;
+                BN is folded back into the conv weights when the model is loaded
+                for inference
+            global_pooling: Use GlobalAveragePooling2D instead of Flatten, shrinking
+                the first Dense from (37*37*conv3_filters) x dense_units to
+                conv3_filters x dense_units weights
             
         Returns:
             Compiled Keras model
         """
         if not TENSORFLOW_AVAILABLE:
             raise RuntimeError("TensorFlow is not available. Cannot build model.")
+        
+        keras.mixed_precision.set_global_policy('mixed_float16' if mixed_precision else 'float32')
 
         model = models.Sequential([
             # Rescaling layer - normalizes pixels to [0, 1]
             layers.Rescaling(1./255, input_shape=input_shape),
             
-            # Conv Block 1
-            layers.Conv2D(conv1_filters, 3, padding='same', activation='relu'),
-            layers.MaxPooling2D(),
-            
-            # Conv Block 2
-            layers.Conv2D(conv2_filters, 3, padding='same', activation='relu'),
-            layers.MaxPooling2D(),
-            
-            # Conv Block 3
-            layers.Conv2D(conv3_filters, 3, padding='same', activation='relu'),
-            layers.MaxPooling2D(),
+            # Conv Blocks 1-3
+            *conv_block(conv1_filters, batch_norm),
+            *conv_block(conv2_filters, batch_norm),
+            *conv_block(conv3_filters, batch_norm),
             
             # Dense layers
-            layers.Flatten(),
+            layers.GlobalAveragePooling2D() if global_pooling else layers.Flatten(),
             layers.Dense(dense_units, activation='relu'),
             layers.Dropout(dropout_rate),
             
-            # Output
-            layers.Dense(num_classes, activation='softmax')
+            # Output (kept in float32 for a numerically stable softmax)
+            layers.Dense(num_classes, activation='softmax', dtype='float32')
         ])
         
         model.compile(
@@ -111,7 +440,11 @@ class ModelPredictor:
         self,
         model_path: Optional[str] = None,
         class_names: Optional[List[str]] = None,
-        low_confidence_threshold: float = 0.5
+        low_confidence_threshold: float = 0.5,
+        use_tflite: bool = False,
+        use_onnx: bool = False,
+        calibration_dir: Optional[str] = None,
+        max_batch_size: int = 1
     ):
         """
         Initialize predictor with optional model path.
@@ -120,16 +453,38 @@ class ModelPredictor:
             model_path: Path to saved model file (.keras or .h5)
             class_names: List of class names for predictions
             low_confidence_threshold: Threshold below which confidence is considered low
+            use_tflite: Run a quantized .tflite model, converting it on first load
+                (an up-to-date sibling .tflite file is reused)
+            use_onnx: Export the model to .onnx and run it with ONNX Runtime
+                when TFLite is not used (requires onnxruntime and tf2onnx)
+            calibration_dir: Image directory for full int8 quantization;
+                dynamic-range quantization is used when not given
+            max_batch_size: Batch concurrent predict() calls up to this size
+                (Keras backend only; 1 disables batching)
         """
         self.model_path = Path(model_path) if model_path else None
         self.class_names = class_names or self.DEFAULT_CLASS_NAMES
         self.low_confidence_threshold = low_confidence_threshold
+        self.use_tflite = use_tflite
+        self.use_onnx = use_onnx
+        self.calibration_dir = Path(calibration_dir) if calibration_dir else None
+        self.max_batch_size = max_batch_size
         self._model = None
+        self._predict_fn = None
+        self._batcher = None
+        self._session = None
+        self._interpreter = None
+        self._interpreter_lock = threading.Lock()
         self._demo_mode = False
         self._model_metadata = None
         
         # Try to load model
         self._load_model()
+        
+        # Set after metadata may have replaced class_names
+        self._class_names_arr = np.asarray(self.class_names, dtype=object)
+        self._rng = np.random.default_rng()
+        self._alpha = np.ones(len(self.class_names))
     
     def _load_model(self) -> None:
         """Attempt to load the model from disk."""
@@ -139,16 +494,32 @@ class ModelPredictor:
             
         if self.model_path and self.model_path.exists():
             try:
-                self._model = keras.models.load_model(str(self.model_path))
+                self._model, self._predict_fn = _load_keras_model(
+                    str(self.model_path.resolve()),
+                    self.model_path.stat().st_mtime
+                )
                 self._demo_mode = False
                 
                 # Try to load metadata for class names
                 metadata_path = self.model_path.with_suffix('.json')
                 if metadata_path.exists():
-                    with open(metadata_path, 'r') as f:
-                        self._model_metadata = json.load(f)
+                    with open(metadata_path, 'rb') as f:
+                        self._model_metadata = _json_loads(f.read())
                         if 'class_names' in self._model_metadata:
                             self.class_names = self._model_metadata['class_names']
+                
+                self._interpreter = self._create_tflite_interpreter()
+                if self._interpreter is None:
+                    self._session = self._create_onnx_session()
+                
+                if self._interpreter is None and self._session is None and self.max_batch_size > 1:
+                    # Padded batches keep one compiled shape; compile it now, not on a user request
+                    self._predict_fn(tf.zeros((self.max_batch_size, *self._model.input_shape[1:]), tf.uint8))
+                    self._batcher = BatchPredictor(
+                        lambda batch: self._predict_fn(tf.convert_to_tensor(batch)).numpy(),
+                        max_batch_size=self.max_batch_size,
+                        pad_to_max=True
+                    )
                             
             except Exception as e:
                 print(f"Error loading model: {e}")
@@ -156,6 +527,133 @@ class ModelPredictor:
         else:
             self._demo_mode = True
     
+    def _representative_dataset(self, max_samples: int = 100):
+        """
+        Yield preprocessed calibration images for int8 quantization: a seeded
+        random sample taken round-robin across class directories, so every class
+        contributes to the activation ranges.
+        """
+        from models.preprocessing import ImagePreprocessor
+        
+        height, width = self._model.input_shape[1:3]
+        preprocessor = ImagePreprocessor(input_size=(width, height), normalize=False)
+        by_class: Dict[Path, List[Path]] = {}
+        for path in sorted(self.calibration_dir.rglob("*")):
+            if path.suffix.lower() in ('.jpg', '.jpeg', '.png'):
+                by_class.setdefault(path.parent, []).append(path)
+        rng = random.Random(123)
+        for class_paths in by_class.values():
+            rng.shuffle(class_paths)
+        image_paths = [
+            path for group in itertools.zip_longest(*by_class.values())
+            for path in group if path is not None
+        ]
+        for path in image_paths[:max_samples]:
+            yield [preprocessor.preprocess(path).astype(np.float32)]
+    
+    def _create_tflite_interpreter(self) -> Optional[Any]:
+        """
+        Create a TFLite interpreter for the loaded Keras model.
+        Only used when use_tflite is set. Reuses a sibling .tflite file when it
+        is up to date; otherwise converts the model with post-training
+        quantization (full int8 with calibration_dir, dynamic-range without).
+        
+        Returns:
+            tf.lite.Interpreter, or None to use the other backends
+        """
+        if not self.use_tflite:
+            return None
+        
+        tflite_path = self.model_path.with_suffix('.tflite')
+        is_fresh = (
+            tflite_path.exists()
+            and tflite_path.stat().st_mtime >= self.model_path.stat().st_mtime
+        )
+        try:
+            if not is_fresh:
+                converter = tf.lite.TFLiteConverter.from_keras_model(self._model)
+                converter.optimizations = [tf.lite.Optimize.DEFAULT]
+                if self.calibration_dir and self.calibration_dir.exists():
+                    converter.representative_dataset = self._representative_dataset
+                    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+                    converter.inference_input_type = tf.uint8
+                    converter.inference_output_type = tf.uint8
+                tflite_path.write_bytes(converter.convert())
+            
+            interpreter = tf.lite.Interpreter(
+                model_path=str(tflite_path),
+                num_threads=os.cpu_count() or 1
+            )
+            interpreter.allocate_tensors()
+            self._tflite_input = interpreter.get_input_details()[0]
+            self._tflite_output = interpreter.get_output_details()[0]
+            return interpreter
+        except Exception as e:
+            print(f"TFLite not used, falling back: {e}")
+            return None
+    
+    def _run_tflite(self, preprocessed_image: np.ndarray) -> np.ndarray:
+        """Run the TFLite interpreter, (de)quantizing input/output as needed."""
+        input_dtype = self._tflite_input['dtype']
+        if input_dtype == np.float32:
+            input_data = preprocessed_image.astype(np.float32, copy=False)
+        else:
+            scale, zero_point = self._tflite_input['quantization']
+            input_data = preprocessed_image / scale + zero_point if scale else preprocessed_image
+            limits = np.iinfo(input_dtype)
+            input_data = np.clip(np.round(input_data), limits.min, limits.max).astype(input_dtype)
+        
+        # Interpreter is not thread-safe; the pipeline is shared across sessions
+        with self._interpreter_lock:
+            self._interpreter.set_tensor(self._tflite_input['index'], input_data)
+            self._interpreter.invoke()
+            output = self._interpreter.get_tensor(self._tflite_output['index'])[0]
+        
+        if self._tflite_output['dtype'] != np.float32:
+            scale, zero_point = self._tflite_output['quantization']
+            output = (output.astype(np.float32) - zero_point) * scale
+        return output
+    
+    def _create_onnx_session(self) -> Optional[Any]:
+        """
+        Create an ONNX Runtime session for the loaded Keras model.
+        The model is exported once to a .onnx file next to the .keras file
+        (requires tf2onnx) and re-exported when the .keras file is newer.
+        
+        Returns:
+            InferenceSession, or None to fall back to Keras
+        """
+        if not (self.use_onnx and ONNXRUNTIME_AVAILABLE):
+            return None
+        
+        onnx_path = self.model_path.with_suffix('.onnx')
+        try:
+            if not onnx_path.exists() or onnx_path.stat().st_mtime < self.model_path.stat().st_mtime:
+                import tf2onnx
+                
+                # Fixed batch of 1, matching the preprocessor output
+                input_signature = (
+                    tf.TensorSpec((1, *self._model.input_shape[1:]), tf.float32, name="input"),
+                )
+                tf2onnx.convert.from_keras(
+                    self._model,
+                    input_signature=input_signature,
+                    opset=17,
+                    output_path=str(onnx_path)
+                )
+            
+            options = ort.SessionOptions()
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            options.intra_op_num_threads = os.cpu_count() or 1
+            return ort.InferenceSession(
+                str(onnx_path),
+                sess_options=options,
+                providers=["CPUExecutionProvider"]
+            )
+        except Exception as e:
+            print(f"ONNX Runtime not used, falling back to Keras: {e}")
+            return None
+    
     def get_model_info(self) -> Dict[str, Any]:
         """Get information about the loaded model."""
         if self._demo_mode:
@@ -166,7 +664,8 @@ class ModelPredictor:
             "model_loaded": True,
             "model_path": str(self.model_path),
             "class_names": self.class_names,
-            "num_classes": len(self.class_names)
+            "num_classes": len(self.class_names),
+            "backend": self._backend_name()
         }
         
         if self._model_metadata:
@@ -174,6 +673,14 @@ class ModelPredictor:
         
         return info
     
+    def _backend_name(self) -> str:
+        """Name of the inference backend in use."""
+        if self._interpreter is not None:
+            return "tflite"
+        if self._session is not None:
+            return "onnxruntime"
+        return "keras"
+    
     def is_demo_mode(self) -> bool:
         """
         Check if predictor is running in demo mode.
@@ -194,8 +701,7 @@ class ModelPredictor:
             Simulated probability array
         """
         # Generate random probabilities
-        probs = np.random.dirichlet(np.ones(len(self.class_names)))
-        return probs
+        return self._rng.dirichlet(self._alpha)
     
     def predict(self, preprocessed_image: np.ndarray, top_k: int = 3) -> PredictionResult:
         """
@@ -213,20 +719,37 @@ class ModelPredictor:
         
         if self._demo_mode:
             probabilities = self._generate_demo_predictions(top_k)
+        elif self._interpreter is not None:
+            probabilities = self._run_tflite(preprocessed_image)
+        elif self._session is not None:
+            input_name = self._session.get_inputs()[0].name
+            feed = {input_name: preprocessed_image.astype(np.float32, copy=False)}
+            probabilities = self._session.run(None, feed)[0][0]
+        elif self._batcher is not None:
+            probabilities = self._batcher.submit(preprocessed_image).result()
+        else:
+            probabilities = self._predict_fn(tf.convert_to_tensor(preprocessed_image)).numpy()[0]
+        
+        probabilities = np.ascontiguousarray(probabilities).ravel()
+        
+        # Get top-k indices sorted by probability (descending); partition first
+        # so only the k selected entries are sorted
+        if top_k >= len(probabilities):
+            top_indices = np.argsort(-probabilities)
         else:
-            probabilities = self._model.predict(preprocessed_image, verbose=0)[0]
-        
-        # Get top-k indices sorted by probability (descending)
-        top_indices = np.argsort(probabilities)[::-1][:top_k]
-        
-        # Build top predictions list
-        top_predictions = []
-        for idx in top_indices:
-            top_predictions.append({
-                "class": self.class_names[idx],
-                "confidence": float(probabilities[idx]),
-                "percentage": float(probabilities[idx] * 100)
-            })
+            candidates = np.argpartition(probabilities, -top_k)[-top_k:]
+            top_indices = candidates[np.argsort(-probabilities[candidates])]
+        
+        # Build top predictions list; gather and scale once, tolist() yields Python floats
+        top_probs = probabilities[top_indices]
+        top_predictions = [
+            {"class": name, "confidence": confidence, "percentage": percentage}
+            for name, confidence, percentage in zip(
+                self._class_names_arr[top_indices].tolist(),
+                top_probs.tolist(),
+                (top_probs * 100).tolist()
+            )
+        ]
         
         # Get best prediction
         best_idx = top_indices[0]
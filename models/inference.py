@@ -23,7 +23,11 @@ class InferencePipeline:
         model_path: Optional[str] = None,
         input_size: tuple = (300, 300),
         class_names: Optional[List[str]] = None,
-        low_confidence_threshold: float = 0.5
+        low_confidence_threshold: float = 0.5,
+        use_tflite: bool = False,
+        use_onnx: bool = False,
+        calibration_dir: Optional[str] = None,
+        max_batch_size: int = 1
     ):
         """
         Initialize the inference pipeline.
@@ -33,13 +37,22 @@ class InferencePipeline:
             input_size: Target input size for preprocessing
             class_names: List of class names for predictions
             low_confidence_threshold: Threshold for low confidence warning
+            use_tflite: Run inference through a quantized TFLite model
+            use_onnx: Run inference through ONNX Runtime when TFLite is not used
+            calibration_dir: Image directory for int8 TFLite calibration
+            max_batch_size: Batch concurrent predictions up to this size
         """
         # normalize=False karena model sudah punya Rescaling layer
-        self.preprocessor = ImagePreprocessor(input_size=input_size, normalize=False)
+        # reuse_buffer aman: hasil preprocess langsung dipakai predict()
+        self.preprocessor = ImagePreprocessor(input_size=input_size, normalize=False, reuse_buffer=True)
         self.predictor = ModelPredictor(
             model_path=model_path,
             class_names=class_names,
-            low_confidence_threshold=low_confidence_threshold
+            low_confidence_threshold=low_confidence_threshold,
+            use_tflite=use_tflite,
+            use_onnx=use_onnx,
+            calibration_dir=calibration_dir,
+            max_batch_size=max_batch_size
         )
         self.validator = ImageValidator()
     
@@ -75,6 +88,24 @@ class InferencePipeline:
         
         return True, None
     
+    def decode(
+        self,
+        image_source: Union[str, Path, bytes, io.BytesIO, Image.Image]
+    ) -> Image.Image:
+        """
+        Decode an image once so the result can be passed to both
+        get_image_info and predict without decoding the source twice.
+        
+        Args:
+            image_source: Image source (path, bytes, BytesIO, or PIL Image)
+            
+        Returns:
+            Fully decoded PIL Image
+        """
+        image = self.preprocessor.load_image(image_source)
+        image.load()
+        return image
+    
     def predict(
         self,
         image_source: Union[str, Path, bytes, io.BytesIO, Image.Image],
@@ -84,7 +115,8 @@ class InferencePipeline:
         Run full inference pipeline on an image.
         
         Args:
-            image_source: Image source (path, bytes, BytesIO, or PIL Image)
+            image_source: Image source (path, bytes, BytesIO, or PIL Image);
+                pass the result of decode() to reuse an already decoded image
             top_k: Number of top predictions to return
             
         Returns:
@@ -106,7 +138,7 @@ class InferencePipeline:
         Get information about an image.
         
         Args:
-            image_source: Image source
+            image_source: Image source, or the result of decode()
             
         Returns:
             Dictionary with image information
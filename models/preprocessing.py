@@ -1,35 +1,90 @@
 """
 Preprocessing module for ATK Classifier.
 Handles image loading, validation, resizing, and normalization.
+
+Pillow-SIMD (a drop-in fork with SSE4/AVX2 decode, convert and resize) can
+replace Pillow without code changes; PILLOW_SIMD_AVAILABLE reports whether it
+is active.
 """
-from typing import Union, Dict, Any, Tuple, List
+from typing import Union, Dict, Any, Tuple, List, Optional
 from pathlib import Path
+import functools
 import io
+import threading
 
 import numpy as np
+import PIL
 from PIL import Image
 
+# Pillow-SIMD releases are versioned as "<pillow version>.postN"
+PILLOW_SIMD_AVAILABLE = '.post' in PIL.__version__
+
+# OpenCV's SIMD resize is much faster than PIL; fall back to PIL without it
+try:
+    import cv2
+    CV2_AVAILABLE = True
+except ImportError:
+    CV2_AVAILABLE = False
+
+
+@functools.lru_cache(maxsize=8)
+def _normalize_extensions(allowed: Tuple[str, ...]) -> frozenset:
+    """Lowercased extension set, cached per allowed-extensions tuple."""
+    return frozenset(ext.lower() for ext in allowed)
+
+
+def _aligned_empty(shape: Tuple[int, ...], dtype: np.dtype, alignment: int = 64) -> np.ndarray:
+    """
+    Uninitialized array whose data pointer is aligned to `alignment` bytes,
+    so TensorFlow can alias it instead of copying and oneDNN takes its fast path.
+    """
+    dtype = np.dtype(dtype)
+    nbytes = int(np.prod(shape)) * dtype.itemsize
+    raw = np.empty(nbytes + alignment, dtype=np.uint8)
+    offset = -raw.ctypes.data % alignment
+    return raw[offset:offset + nbytes].view(dtype).reshape(shape)
+
 
 class ImagePreprocessor:
     """Handles image preprocessing for CNN model input."""
     
-    def __init__(self, input_size: Tuple[int, int] = (300, 300), normalize: bool = True):
+    def __init__(
+        self,
+        input_size: Tuple[int, int] = (300, 300),
+        normalize: bool = True,
+        dtype: np.dtype = np.float32,
+        reuse_buffer: bool = False
+    ):
         """
         Initialize preprocessor with target input size.
         
         Args:
             input_size: Target dimensions (width, height) for resizing
             normalize: Whether to normalize pixel values (set False if model has Rescaling layer)
+            dtype: Floating dtype of normalized output (np.float16 halves memory
+                traffic); unnormalized output is always uint8
+            reuse_buffer: Write every result into one per-thread output buffer
+                instead of allocating; a result is only valid until the next
+                preprocess() call on the same thread
         """
         self.input_size = input_size
         self.normalize = normalize
+        self.dtype = np.dtype(dtype)
+        self.reuse_buffer = reuse_buffer
+        self._local = threading.local()
     
-    def load_image(self, image_source: Union[str, Path, bytes, io.BytesIO, Image.Image]) -> Image.Image:
+    def load_image(
+        self,
+        image_source: Union[str, Path, bytes, io.BytesIO, Image.Image],
+        draft: bool = False
+    ) -> Image.Image:
         """
         Load image from various sources.
         
         Args:
             image_source: File path, bytes, BytesIO, or PIL Image
+            draft: Let libjpeg decode JPEGs at a reduced scale (1/2 to 1/8), at least
+                twice input_size. Changes the image size, so only for preprocessing
             
         Returns:
             PIL Image object
@@ -37,13 +92,24 @@ class ImagePreprocessor:
         if isinstance(image_source, Image.Image):
             return image_source
         elif isinstance(image_source, (str, Path)):
-            return Image.open(image_source)
+            image = Image.open(image_source)
         elif isinstance(image_source, bytes):
-            return Image.open(io.BytesIO(image_source))
+            image = Image.open(io.BytesIO(image_source))
         elif isinstance(image_source, io.BytesIO):
-            return Image.open(image_source)
+            image = Image.open(image_source)
         else:
             raise ValueError(f"Unsupported image source type: {type(image_source)}")
+        
+        if draft and image.format == 'JPEG':
+            image.draft('RGB', (self.input_size[0] * 2, self.input_size[1] * 2))
+        return image
+    
+    def _cv2_resize(self, image: Image.Image, dst: Optional[np.ndarray] = None) -> np.ndarray:
+        """Resize an RGB/L PIL image with OpenCV, returning a uint8 array (dst if given)."""
+        # INTER_AREA for shrinking (most uploads), INTER_LINEAR for enlarging
+        is_downscale = image.width >= self.input_size[0] and image.height >= self.input_size[1]
+        interpolation = cv2.INTER_AREA if is_downscale else cv2.INTER_LINEAR
+        return cv2.resize(np.asarray(image), self.input_size, dst=dst, interpolation=interpolation)
     
     def resize_image(self, image: Image.Image) -> Image.Image:
         """
@@ -55,6 +121,12 @@ class ImagePreprocessor:
         Returns:
             Resized PIL Image
         """
+        if image.size == self.input_size:
+            return image
+        
+        if CV2_AVAILABLE and image.mode in ('RGB', 'L'):
+            return Image.fromarray(self._cv2_resize(image))
+        
         return image.resize(self.input_size, Image.Resampling.LANCZOS)
 
     def normalize_image(self, image: Image.Image) -> np.ndarray:
@@ -74,36 +146,86 @@ class ImagePreprocessor:
         # Convert to numpy array
         if self.normalize:
             # Normalize to [0, 1] for models without Rescaling layer
-            img_array = np.array(image, dtype=np.float32) / 255.0
+            img_array = np.divide(np.asarray(image), self.dtype.type(255.0), dtype=self.dtype)
         else:
             # Keep as uint8 [0, 255] for models with Rescaling layer
-            img_array = np.array(image, dtype=np.float32)
+            img_array = np.asarray(image, dtype=np.uint8)
         
         return img_array
     
-    def preprocess(self, image_source: Union[str, Path, bytes, io.BytesIO, Image.Image]) -> np.ndarray:
+    def _resize_to_rgb_array(self, image: Image.Image, out: Optional[np.ndarray] = None) -> np.ndarray:
         """
-        Full preprocessing pipeline: load, resize, normalize, and add batch dimension.
+        Resize image and convert to an RGB uint8 array in one pass.
         
         Args:
-            image_source: Image source (path, bytes, BytesIO, or PIL Image)
+            image: PIL Image of any mode and size
+            out: Optional (height, width, 3) uint8 array to write into
             
         Returns:
-            Preprocessed numpy array with shape (1, height, width, 3)
+            Numpy uint8 array with shape (height, width, 3)
         """
-        # Load image
-        image = self.load_image(image_source)
+        # Skip the resize entirely when already at target size (pre-cropped datasets)
+        if image.size != self.input_size:
+            if CV2_AVAILABLE and image.mode == 'RGB':
+                return self._cv2_resize(image, dst=out)
+            if CV2_AVAILABLE and image.mode == 'L':
+                return cv2.cvtColor(self._cv2_resize(image), cv2.COLOR_GRAY2RGB, dst=out)
+            
+            # PIL fallback: resize first so the mode conversion runs on the small image
+            image = image.resize(self.input_size, Image.Resampling.LANCZOS)
         
-        # Resize to target dimensions
-        image = self.resize_image(image)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        if out is None:
+            return np.asarray(image)
+        out[...] = np.asarray(image)
+        return out
+    
+    def _output_buffer(self, dtype: np.dtype) -> np.ndarray:
+        """Aligned (1, height, width, 3) output array, reused per thread if enabled."""
+        shape = (1, self.input_size[1], self.input_size[0], 3)
+        if not self.reuse_buffer:
+            return _aligned_empty(shape, dtype)
         
-        # Normalize and convert to RGB
-        img_array = self.normalize_image(image)
+        buffers = self._local.__dict__.setdefault('buffers', {})
+        if dtype not in buffers:
+            buffers[dtype] = _aligned_empty(shape, dtype)
+        return buffers[dtype]
+    
+    def _to_batch(self, image: Image.Image, normalize: bool) -> np.ndarray:
+        """
+        Resize, convert to RGB, cast and add the batch dimension, writing the
+        result straight into an aligned output array (no intermediate full-size copies).
         
-        # Add batch dimension
-        img_array = np.expand_dims(img_array, axis=0)
+        Args:
+            image: Loaded PIL Image
+            normalize: Whether to scale pixel values to [0, 1]
+            
+        Returns:
+            Numpy array with shape (1, height, width, 3); uint8 if not normalized
+        """
+        if not normalize:
+            # uint8 straight to the model; the cast is fused into its first layer
+            batch = self._output_buffer(np.dtype(np.uint8))
+            self._resize_to_rgb_array(image, out=batch[0])
+            return batch
         
-        return img_array
+        batch = self._output_buffer(self.dtype)
+        np.divide(self._resize_to_rgb_array(image), self.dtype.type(255.0), out=batch[0])
+        return batch
+    
+    def preprocess(self, image_source: Union[str, Path, bytes, io.BytesIO, Image.Image]) -> np.ndarray:
+        """
+        Full preprocessing pipeline: load, resize, normalize, and add batch dimension.
+        
+        Args:
+            image_source: Image source (path, bytes, BytesIO, or PIL Image)
+            
+        Returns:
+            Preprocessed numpy array with shape (1, height, width, 3)
+        """
+        image = self.load_image(image_source, draft=True)
+        return self._to_batch(image, self.normalize)
     
     def preprocess_for_model_with_rescaling(self, image_source: Union[str, Path, bytes, io.BytesIO, Image.Image]) -> np.ndarray:
         """
@@ -116,22 +238,8 @@ class ImagePreprocessor:
         Returns:
             Preprocessed numpy array with pixel values in [0, 255]
         """
-        # Load image
-        image = self.load_image(image_source)
-        
-        # Resize to target dimensions
-        image = self.resize_image(image)
-        
-        # Convert to RGB without normalizing
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
-        
-        img_array = np.array(image, dtype=np.float32)
-        
-        # Add batch dimension
-        img_array = np.expand_dims(img_array, axis=0)
-        
-        return img_array
+        image = self.load_image(image_source, draft=True)
+        return self._to_batch(image, normalize=False)
 
 
 class ImageValidator:
@@ -166,8 +274,8 @@ class ImageValidator:
         if not filename or '.' not in filename:
             return False
         
-        extension = filename.rsplit('.', 1)[-1].lower()
-        return extension in [ext.lower() for ext in allowed]
+        extension = filename.rpartition('.')[2].lower()
+        return extension in _normalize_extensions(tuple(allowed))
     
     @staticmethod
     def get_image_info(image: Image.Image) -> Dict[str, Any]:
@@ -5,36 +5,85 @@ Handles dataset preparation, model training, and hyperparameter tuning.
 import os
 import sys
 import json
+import argparse
 import shutil
+import hashlib
+import importlib.util
+import math
+import queue
+import random
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 from datetime import datetime
 from typing import Optional, Dict, Any, Tuple, List, Callable
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, replace
 
-# Add parent directory to path for imports
-sys.path.insert(0, str(Path(__file__).parent.parent))
+# Add parent directory to path for imports (once, even if re-imported)
+root_dir = str(Path(__file__).parent.parent)
+if root_dir not in sys.path:
+    sys.path.insert(0, root_dir)
 
 import numpy as np
 
+# Dedicated GPU launch threads so input prefetch overlaps with compute; must be
+# set before TensorFlow initializes its GPU devices
+os.environ.setdefault('TF_GPU_THREAD_MODE', 'gpu_private')
+os.environ.setdefault('TF_GPU_THREAD_COUNT', '2')
+# Stream-ordered caching allocator instead of device-synchronizing
+# cudaMalloc/cudaFree per intermediate; grow the pool on demand
+os.environ.setdefault('TF_GPU_ALLOCATOR', 'cuda_malloc_async')
+os.environ.setdefault('TF_FORCE_GPU_ALLOW_GROWTH', 'true')
+
+# TensorFlow, OpenCV and Optuna are imported on first use (see
+# _require_tensorflow), so --help and argument errors don't pay their import
+TENSORFLOW_AVAILABLE = importlib.util.find_spec("tensorflow") is not None
+tf = keras = layers = models = optimizers = EarlyStopping = ModelCheckpoint = None
+
+CV2_AVAILABLE = importlib.util.find_spec("cv2") is not None
+
+# Optional Optuna for parallel hyperparameter search
+OPTUNA_AVAILABLE = importlib.util.find_spec("optuna") is not None
+
+# Optional orjson for faster metadata writing (also serializes numpy scalars)
 try:
+    import orjson
+    
+    def _json_dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY)
+except ImportError:
+    def _json_dumps(obj: Any) -> bytes:
+        return json.dumps(obj, indent=2).encode()
+
+
+def _require_tensorflow() -> None:
+    """Import TensorFlow and Keras into the module globals, once."""
+    global tf, keras, layers, models, optimizers, EarlyStopping, ModelCheckpoint
+    if not TENSORFLOW_AVAILABLE:
+        raise RuntimeError("TensorFlow not available")
+    if tf is not None:
+        return
+    
+    # Hide C++ info and warning logs (errors still shown)
+    os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
     import tensorflow as tf
     from tensorflow.keras import layers, models, optimizers
     from tensorflow.keras.callbacks import EarlyStopping, ModelCheckpoint
     keras = tf.keras
-    TENSORFLOW_AVAILABLE = True
-except ImportError:
-    TENSORFLOW_AVAILABLE = False
-    keras = None
 
-try:
-    import cv2
-    import imghdr
-    CV2_AVAILABLE = True
-except ImportError:
-    CV2_AVAILABLE = False
 
+# Same value as tf.data.AUTOTUNE, usable without importing TensorFlow
+AUTOTUNE = -1
 
-@dataclass
+# TrainingConfig.mixed_precision -> Keras dtype policy
+PRECISION_POLICIES = {
+    "off": "float32",
+    "fp16": "mixed_float16",   # GPUs with float16 tensor cores; needs loss scaling
+    "bf16": "mixed_bfloat16"   # TPUs / Ampere+; float32 range, no loss scaling
+}
+
+
+@dataclass(slots=True, frozen=True)
 class TrainingConfig:
     """Configuration for model training."""
     img_height: int = 300
@@ -44,6 +93,10 @@ class TrainingConfig:
     validation_split: float = 0.1
     learning_rate: float = 0.001
     early_stopping_patience: int = 3
+    early_stopping_min_delta: float = 0.0  # Smallest val_loss drop that counts as improvement
+    jit_compile: bool = True  # XLA-compile the train/eval step
+    steps_per_execution: int = 1  # Training steps run per tf.function call
+    mixed_precision: str = "off"  # "off", "fp16" or "bf16" compute with float32 variables
     
     # Model architecture params
     conv1_filters: int = 32
@@ -51,9 +104,11 @@ class TrainingConfig:
     conv3_filters: int = 128
     dense_units: int = 128
     dropout_rate: float = 0.5
+    global_pooling: bool = False  # GlobalAveragePooling2D head instead of Flatten
+    batch_norm: bool = False  # Conv -> BN -> ReLU blocks (BN folded into conv at inference)
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class TrainingResult:
     """Results from model training."""
     model_path: str
@@ -68,102 +123,371 @@ class TrainingResult:
     timestamp: str
 
 
+def _is_class_dir(entry: os.DirEntry) -> bool:
+    """
+    Same rule as Keras image_dataset_from_directory: a (possibly symlinked)
+    subdirectory whose name does not start with "." (skips .ipynb_checkpoints etc.).
+    """
+    return entry.is_dir() and not entry.name.startswith('.')
+
+
 class DatasetManager:
     """Manages dataset loading and preprocessing."""
     
     VALID_EXTENSIONS = ['jpeg', 'jpg', 'png']
+    # File signatures of the valid formats (JPEG SOI marker, PNG header)
+    MAGIC_BYTES = (b'\xff\xd8\xff', b'\x89PNG\r\n\x1a\n')
     
-    def __init__(self, dataset_dir: str, img_size: Tuple[int, int] = (300, 300)):
+    def __init__(
+        self,
+        dataset_dir: str,
+        img_size: Tuple[int, int] = (300, 300),
+        cache_dir: Optional[str] = None,
+        cache: bool = True,
+        tfrecord_dir: Optional[str] = None,
+        prefetch_buffer: int = AUTOTUNE,
+        num_parallel_calls: int = AUTOTUNE,
+        interleave_cycle: int = 8,
+        prefetch_to_device: Optional[str] = None,
+        device_buffer: int = 2,
+        fast_jpeg: bool = False,
+        deterministic: bool = False,
+        resize_method: str = "bilinear"
+    ):
+        """
+        Initialize dataset manager.
+        
+        Args:
+            dataset_dir: Directory with one subdirectory per class
+            img_size: Target image size (height, width)
+            cache_dir: Cache decoded batches on disk here instead of in memory;
+                the first epoch fills the cache, later epochs only read it
+            cache: Cache decoded batches at all; disable when the dataset does
+                not fit in memory and no cache_dir is given
+            tfrecord_dir: Where export_tfrecords writes shards; load_dataset reads
+                them instead of the image files while they are up to date. Keep
+                it outside dataset_dir (a subdirectory would be picked up as an
+                extra class). None disables TFRecords
+            prefetch_buffer: Batches prefetched ahead of training (AUTOTUNE = dynamic)
+            num_parallel_calls: Parallelism of record parsing and shard reading
+            interleave_cycle: Number of TFRecord shards read concurrently
+            prefetch_to_device: Device (e.g. "/gpu:0") to stage batches on ahead
+                of the training step, hiding host-to-device copies
+            device_buffer: Number of batches staged on the device
+            fast_jpeg: Decode TFRecord JPEGs with the faster, slightly less
+                accurate integer DCT
+            deterministic: Keep element order of parallel reads and maps
+                (reproducible, but a slow image stalls the pipeline)
+            resize_method: Interpolation when resizing images ("bilinear",
+                "nearest", "bicubic", "area", ...)
+        """
         self.dataset_dir = Path(dataset_dir)
         self.img_size = img_size
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.cache = cache
+        self.tfrecord_dir = Path(tfrecord_dir) if tfrecord_dir else None
+        self.prefetch_buffer = prefetch_buffer
+        self.num_parallel_calls = num_parallel_calls
+        self.interleave_cycle = interleave_cycle
+        self.prefetch_to_device = prefetch_to_device
+        self.device_buffer = device_buffer
+        self.fast_jpeg = fast_jpeg
+        self.deterministic = deterministic
+        self.resize_method = resize_method
+    
+    def _cache_path(self, subset: str, batch_size: int) -> str:
+        """
+        Disk cache prefix for a subset, keyed by image size, batch size, decode
+        settings, class directory and TFRecord export mtimes so changed data
+        invalidates the cache.
+        """
+        stamp = [self.img_size, batch_size, self.fast_jpeg, self.resize_method] + sorted(
+            (entry.name, entry.stat().st_mtime_ns)
+            for entry in os.scandir(self.dataset_dir) if _is_class_dir(entry)
+        )
+        if self.tfrecords_up_to_date():
+            stamp.append((self.tfrecord_dir / "tfrecords.json").stat().st_mtime_ns)
+        digest = hashlib.md5(repr(stamp).encode()).hexdigest()[:12]
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        return str(self.cache_dir / f"{subset}_{digest}")
+    
+    def _validate_one(self, image_path: str) -> str:
+        """
+        Check that one image decodes and has a valid type; delete it otherwise.
+        
+        Returns:
+            "valid", "removed", or "invalid" for an invalid image that could
+            not be deleted
+        """
+        import cv2
+
+        try:
+            # Cheap header sniff first; only matching files are decoded, at 1/8 scale
+            with open(image_path, 'rb') as f:
+                header = f.read(8)
+            if header.startswith(self.MAGIC_BYTES):
+                if cv2.imread(image_path, cv2.IMREAD_REDUCED_COLOR_8) is not None:
+                    return "valid"
+        except (OSError, cv2.error):
+            pass
+        
+        try:
+            Path(image_path).unlink(missing_ok=True)
+        except OSError:
+            # e.g. read-only mount (EROFS) or no permission: keep validating the
+            # remaining images
+            return "invalid"
+        return "removed"
     
     def validate_and_clean_images(self, progress_callback: Optional[Callable] = None) -> Dict[str, int]:
         """
         Validate images and remove corrupted files.
+        Images are checked in a thread pool (cv2 releases the GIL while decoding);
+        progress_callback is called from the calling thread at most ~100 times
+        (every 1% of images, plus once at the end).
         
         Returns:
-            Dictionary with counts of valid, removed, and total images
+            Dictionary with counts of valid, removed, invalid (could not be
+            removed), and total images
         """
         if not CV2_AVAILABLE:
-            return {"valid": 0, "removed": 0, "total": 0, "error": "OpenCV not available"}
+            return {"valid": 0, "removed": 0, "invalid": 0, "total": 0, "error": "OpenCV not available"}
         
-        stats = {"valid": 0, "removed": 0, "total": 0}
+        stats = {"valid": 0, "removed": 0, "invalid": 0, "total": 0}
         
         if not self.dataset_dir.exists():
-            return {"valid": 0, "removed": 0, "total": 0, "error": "Dataset directory not found"}
+            return {"valid": 0, "removed": 0, "invalid": 0, "total": 0, "error": "Dataset directory not found"}
         
-        for class_dir in self.dataset_dir.iterdir():
-            if not class_dir.is_dir():
-                continue
-                
-            for image_path in class_dir.iterdir():
+        image_paths = [
+            entry.path
+            for class_entry in os.scandir(self.dataset_dir) if _is_class_dir(class_entry)
+            for entry in os.scandir(class_entry.path) if entry.is_file()
+        ]
+        
+        report_every = max(1, len(image_paths) // 100)
+        
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            for status in executor.map(self._validate_one, image_paths):
                 stats["total"] += 1
-                try:
-                    img = cv2.imread(str(image_path))
-                    if img is None:
-                        image_path.unlink()
-                        stats["removed"] += 1
-                        continue
-                    
-                    tip = imghdr.what(str(image_path))
-                    if tip not in self.VALID_EXTENSIONS:
-                        image_path.unlink()
-                        stats["removed"] += 1
-                        continue
-                    
-                    stats["valid"] += 1
-                    
-                except Exception:
-                    try:
-                        image_path.unlink()
-                    except:
-                        pass
-                    stats["removed"] += 1
+                stats[status] += 1
                 
-                if progress_callback:
+                if progress_callback and (
+                    stats["total"] % report_every == 0 or stats["total"] == len(image_paths)
+                ):
                     progress_callback(stats["total"])
         
         return stats
     
-    def load_dataset(self) -> Tuple[Any, Any, List[str]]:
+    def _class_names(self) -> List[str]:
+        """
+        Sorted names of class directories that contain files. Empty classes (e.g.
+        every image removed by validate_and_clean_images) are skipped with a
+        warning; they would otherwise get a label with no examples.
         """
-        Load dataset using TensorFlow image_dataset_from_directory.
+        class_names, empty = [], []
+        with os.scandir(self.dataset_dir) as class_entries:
+            for class_entry in class_entries:
+                if not _is_class_dir(class_entry):
+                    continue
+                with os.scandir(class_entry.path) as entries:
+                    has_files = any(entry.is_file() for entry in entries)
+                (class_names if has_files else empty).append(class_entry.name)
+        
+        if empty:
+            print(f"Warning: skipping empty class directories: {sorted(empty)}")
+        return sorted(class_names)
+    
+    def export_tfrecords(self, shard_size: int = 1024, validation_split: float = 0.1) -> Dict[str, int]:
+        """
+        Write the dataset as sharded TFRecords of resized JPEGs, split into
+        train/val once (seed 123), so training reads a few large files instead
+        of decoding and resizing every image.
+        
+        Args:
+            shard_size: Number of images per shard
+            validation_split: Fraction of images in the validation shards
+            
+        Returns:
+            Dictionary with the number of train and val images written
+        """
+        _require_tensorflow()
+        if self.tfrecord_dir is None:
+            raise ValueError("tfrecord_dir is not set")
+        
+        class_names = self._class_names()
+        files = [
+            (entry.path, label)
+            for label, class_name in enumerate(class_names)
+            for entry in sorted(os.scandir(self.dataset_dir / class_name), key=lambda e: e.name)
+            if entry.is_file()
+        ]
+        random.Random(123).shuffle(files)
+        num_val = int(len(files) * validation_split)
+        splits = {"train": files[num_val:], "val": files[:num_val]}
+        
+        self.tfrecord_dir.mkdir(parents=True, exist_ok=True)
+        for old_shard in self.tfrecord_dir.glob("*.tfrecord"):
+            old_shard.unlink()
+        
+        for subset, subset_files in splits.items():
+            num_shards = max(1, math.ceil(len(subset_files) / shard_size))
+            for index in range(num_shards):
+                shard_path = self.tfrecord_dir / f"{subset}-{index:05d}-of-{num_shards:05d}.tfrecord"
+                with tf.io.TFRecordWriter(str(shard_path)) as writer:
+                    for image_path, label in subset_files[index * shard_size:(index + 1) * shard_size]:
+                        image = tf.io.decode_image(tf.io.read_file(image_path), channels=3, expand_animations=False)
+                        image = tf.cast(tf.round(tf.image.resize(image, self.img_size, method=self.resize_method)), tf.uint8)
+                        example = tf.train.Example(features=tf.train.Features(feature={
+                            'image/encoded': tf.train.Feature(
+                                bytes_list=tf.train.BytesList(value=[tf.io.encode_jpeg(image, quality=95).numpy()])
+                            ),
+                            'image/class/label': tf.train.Feature(int64_list=tf.train.Int64List(value=[label]))
+                        }))
+                        writer.write(example.SerializeToString())
+        
+        with open(self.tfrecord_dir / "tfrecords.json", 'w') as f:
+            json.dump({
+                "class_names": class_names,
+                "img_size": list(self.img_size),
+                "resize_method": self.resize_method
+            }, f, indent=2)
+        
+        return {"train": len(splits["train"]), "val": num_val}
+    
+    def _tfrecord_class_names(self) -> Optional[List[str]]:
+        """
+        Class names of exported TFRecords, or None if not configured, absent or
+        exported with another image size or resize method.
+        """
+        if self.tfrecord_dir is None:
+            return None
+        info_path = self.tfrecord_dir / "tfrecords.json"
+        if not info_path.exists():
+            return None
+        
+        with open(info_path) as f:
+            info = json.load(f)
+        if tuple(info["img_size"]) != tuple(self.img_size):
+            return None
+        if info.get("resize_method", "bilinear") != self.resize_method:
+            return None
+        return info["class_names"]
+    
+    def tfrecords_up_to_date(self) -> bool:
+        """
+        True if TFRecords exist for this image size and resize method and are
+        newer than the dataset directory and every class directory (adding or
+        removing an image or class updates those mtimes).
+        """
+        if self._tfrecord_class_names() is None:
+            return False
+        
+        exported = (self.tfrecord_dir / "tfrecords.json").stat().st_mtime_ns
+        if self.dataset_dir.stat().st_mtime_ns > exported:
+            return False
+        with os.scandir(self.dataset_dir) as entries:
+            return all(entry.stat().st_mtime_ns <= exported for entry in entries if _is_class_dir(entry))
+    
+    def _load_tfrecord_subset(self, subset: str, batch_size: int) -> Any:
+        """Read one subset's shards with parallel interleaved IO and decoding."""
+        feature_spec = {
+            'image/encoded': tf.io.FixedLenFeature([], tf.string),
+            'image/class/label': tf.io.FixedLenFeature([], tf.int64)
+        }
+        
+        def parse(record):
+            features = tf.io.parse_single_example(record, feature_spec)
+            image = tf.io.decode_jpeg(
+                features['image/encoded'], channels=3,
+                dct_method='INTEGER_FAST' if self.fast_jpeg else ''
+            )
+            image = tf.cast(tf.ensure_shape(image, (*self.img_size, 3)), tf.float32)
+            return image, tf.cast(features['image/class/label'], tf.int32)
+        
+        shards = tf.data.Dataset.list_files(
+            str(self.tfrecord_dir / f"{subset}-*.tfrecord"), shuffle=(subset == "train")
+        )
+        return shards.interleave(
+            tf.data.TFRecordDataset,
+            cycle_length=self.interleave_cycle,
+            num_parallel_calls=self.num_parallel_calls
+        ).map(parse, num_parallel_calls=self.num_parallel_calls).batch(batch_size)
+    
+    def load_dataset(self, batch_size: int = 15) -> Tuple[Any, Any, List[str]]:
+        """
+        Load dataset from exported TFRecords if tfrecord_dir is set and they are
+        up to date (see export_tfrecords), otherwise using TensorFlow
+        image_dataset_from_directory.
+        
+        Args:
+            batch_size: Global batch size (per-replica size x number of replicas)
         
         Returns:
             Tuple of (train_ds, val_ds, class_names)
         """
-        if not TENSORFLOW_AVAILABLE:
-            raise RuntimeError("TensorFlow not available")
+        _require_tensorflow()
         
         if not self.dataset_dir.exists():
             raise FileNotFoundError(f"Dataset directory not found: {self.dataset_dir}")
         
-        # Training set
-        train_ds = tf.keras.utils.image_dataset_from_directory(
-            str(self.dataset_dir),
-            validation_split=0.1,
-            subset="training",
-            seed=123,
-            image_size=self.img_size,
-            batch_size=15
-        )
+        class_names = self._tfrecord_class_names() if self.tfrecords_up_to_date() else None
+        if self.tfrecord_dir is not None and class_names is None:
+            print(f"TFRecords in {self.tfrecord_dir} are missing or stale; reading images instead")
+        if class_names is not None:
+            train_ds = self._load_tfrecord_subset("train", batch_size)
+            val_ds = self._load_tfrecord_subset("val", batch_size)
+        else:
+            # Explicit, sorted non-empty classes keep label indices stable
+            directory_classes = self._class_names()
+            
+            # Training set
+            train_ds = tf.keras.utils.image_dataset_from_directory(
+                str(self.dataset_dir),
+                validation_split=0.1,
+                subset="training",
+                seed=123,
+                image_size=self.img_size,
+                batch_size=batch_size,
+                class_names=directory_classes,
+                interpolation=self.resize_method
+            )
+            
+            # Validation set
+            val_ds = tf.keras.utils.image_dataset_from_directory(
+                str(self.dataset_dir),
+                validation_split=0.1,
+                subset="validation",
+                seed=123,
+                image_size=self.img_size,
+                batch_size=batch_size,
+                class_names=directory_classes,
+                interpolation=self.resize_method
+            )
+            
+            class_names = train_ds.class_names
         
-        # Validation set
-        val_ds = tf.keras.utils.image_dataset_from_directory(
-            str(self.dataset_dir),
-            validation_split=0.1,
-            subset="validation",
-            seed=123,
-            image_size=self.img_size,
-            batch_size=15
-        )
+        # Optimize performance: cache decoded batches before shuffling so images
+        # are decoded once, not every epoch
+        if self.cache:
+            train_ds = train_ds.cache(self._cache_path("train", batch_size) if self.cache_dir else "")
+            val_ds = val_ds.cache(self._cache_path("val", batch_size) if self.cache_dir else "")
+        train_ds = train_ds.shuffle(1000, reshuffle_each_iteration=True).prefetch(self.prefetch_buffer)
+        val_ds = val_ds.prefetch(self.prefetch_buffer)
         
-        class_names = train_ds.class_names
+        # Shard by element under MirroredStrategy (image_dataset_from_directory has
+        # no file list to shard, and there are usually fewer shards than workers)
+        options = tf.data.Options()
+        options.experimental_distribute.auto_shard_policy = tf.data.experimental.AutoShardPolicy.DATA
+        # Let parallel interleave/map emit elements as soon as they are ready
+        options.deterministic = self.deterministic
+        train_ds = train_ds.with_options(options)
+        val_ds = val_ds.with_options(options)
         
-        # Optimize performance
-        AUTOTUNE = tf.data.AUTOTUNE
-        train_ds = train_ds.cache().shuffle(1000).prefetch(buffer_size=AUTOTUNE)
-        val_ds = val_ds.cache().prefetch(buffer_size=AUTOTUNE)
+        # Must be the last transformation
+        if self.prefetch_to_device:
+            to_device = tf.data.experimental.prefetch_to_device(self.prefetch_to_device, self.device_buffer)
+            train_ds = train_ds.apply(to_device)
+            val_ds = val_ds.apply(to_device)
         
         return train_ds, val_ds, class_names
     
@@ -179,22 +503,59 @@ class DatasetManager:
         if not info["exists"]:
             return info
         
-        for class_dir in self.dataset_dir.iterdir():
-            if class_dir.is_dir():
-                class_name = class_dir.name
-                image_count = len(list(class_dir.glob("*")))
-                info["classes"].append(class_name)
-                info["class_counts"][class_name] = image_count
+        with os.scandir(self.dataset_dir) as class_entries:
+            for class_entry in class_entries:
+                if not _is_class_dir(class_entry):
+                    continue
+                with os.scandir(class_entry.path) as entries:
+                    image_count = sum(1 for entry in entries if entry.is_file())
+                info["classes"].append(class_entry.name)
+                info["class_counts"][class_entry.name] = image_count
                 info["total_images"] += image_count
         
         return info
 
 
+def limit_gpu_memory(memory_limit_mb: int) -> None:
+    """
+    Cap the memory TensorFlow may allocate on each visible GPU.
+    
+    Must run before the first GPU op, i.e. before any model or dataset is built.
+    
+    Args:
+        memory_limit_mb: Per-GPU memory limit in megabytes
+    """
+    _require_tensorflow()
+    
+    for gpu in tf.config.list_physical_devices('GPU'):
+        tf.config.set_logical_device_configuration(
+            gpu, [tf.config.LogicalDeviceConfiguration(memory_limit=memory_limit_mb)]
+        )
+
+
+def get_distribution_strategy(num_gpus: Optional[int] = None) -> Any:
+    """
+    MirroredStrategy (synchronous data parallelism) when several GPUs are
+    used, otherwise the default single-device strategy.
+    
+    Args:
+        num_gpus: Number of GPUs to use (the first N); all visible GPUs if None
+    """
+    _require_tensorflow()
+    
+    available = len(tf.config.list_physical_devices('GPU'))
+    num_gpus = available if num_gpus is None else min(num_gpus, available)
+    if num_gpus > 1:
+        return tf.distribute.MirroredStrategy(devices=[f"/gpu:{i}" for i in range(num_gpus)])
+    return tf.distribute.get_strategy()
+
+
 class ATKModelTrainer:
     """Handles model building and training."""
     
-    def __init__(self, config: Optional[TrainingConfig] = None):
+    def __init__(self, config: Optional[TrainingConfig] = None, strategy: Optional[Any] = None):
         self.config = config or TrainingConfig()
+        self.strategy = strategy
         self.model = None
         self.history = None
         self.class_names = []
@@ -209,38 +570,44 @@ class ATKModelTrainer:
         Returns:
             Compiled Keras model
         """
-        if not TENSORFLOW_AVAILABLE:
-            raise RuntimeError("TensorFlow not available")
+        _require_tensorflow()
+        from models.cnn_model import conv_block
+        
+        # Set explicitly either way: the policy is process-global and would
+        # otherwise leak into the next build
+        keras.mixed_precision.set_global_policy(PRECISION_POLICIES[self.config.mixed_precision])
         
+        # Sequential on purpose: inference folds Rescaling/BatchNorm only for Sequential
+        # models. Layout is pinned to NHWC rather than read from keras.json
         model = models.Sequential([
             # Rescaling layer (normalization)
             layers.Rescaling(1./255, input_shape=(self.config.img_height, self.config.img_width, 3)),
             
-            # Conv Block 1
-            layers.Conv2D(self.config.conv1_filters, 3, padding='same', activation='relu'),
-            layers.MaxPooling2D(),
+            # Conv Blocks 1-3
+            *conv_block(self.config.conv1_filters, self.config.batch_norm, data_format='channels_last'),
+            *conv_block(self.config.conv2_filters, self.config.batch_norm, data_format='channels_last'),
+            *conv_block(self.config.conv3_filters, self.config.batch_norm, data_format='channels_last'),
             
-            # Conv Block 2
-            layers.Conv2D(self.config.conv2_filters, 3, padding='same', activation='relu'),
-            layers.MaxPooling2D(),
-            
-            # Conv Block 3
-            layers.Conv2D(self.config.conv3_filters, 3, padding='same', activation='relu'),
-            layers.MaxPooling2D(),
-            
-            # Dense layers
-            layers.Flatten(),
+            # Dense layers (GAP shrinks the first Dense from ~22M to 16K weights at 300x300)
+            layers.GlobalAveragePooling2D(data_format='channels_last') if self.config.global_pooling else layers.Flatten(),
             layers.Dense(self.config.dense_units, activation='relu'),
             layers.Dropout(self.config.dropout_rate),
             
-            # Output
-            layers.Dense(num_classes, activation='softmax')
+            # Output (kept in float32 for a numerically stable softmax and loss)
+            layers.Dense(num_classes, activation='softmax', dtype='float32')
         ])
         
+        optimizer = optimizers.Adam(learning_rate=self.config.learning_rate)
+        if self.config.mixed_precision == "fp16":
+            # Dynamic loss scaling keeps small float16 gradients from underflowing
+            optimizer = keras.mixed_precision.LossScaleOptimizer(optimizer)
+        
         model.compile(
-            optimizer=optimizers.Adam(learning_rate=self.config.learning_rate),
+            optimizer=optimizer,
             loss=tf.keras.losses.SparseCategoricalCrossentropy(from_logits=False),
-            metrics=['accuracy']
+            metrics=['accuracy'],
+            jit_compile=self.config.jit_compile,
+            steps_per_execution=self.config.steps_per_execution
         )
         
         self.model = model
@@ -252,7 +619,8 @@ class ATKModelTrainer:
         val_ds,
         class_names: List[str],
         model_save_path: str = "models/best_model.keras",
-        progress_callback: Optional[Callable] = None
+        progress_callback: Optional[Callable] = None,
+        profile_dir: Optional[str] = None
     ) -> TrainingResult:
         """
         Train the model.
@@ -263,22 +631,29 @@ class ATKModelTrainer:
             class_names: List of class names
             model_save_path: Path to save the trained model
             progress_callback: Optional callback for progress updates
+            profile_dir: Write a TensorBoard profiler trace of training steps
+                10-20 here (after compilation warm-up) to find input or
+                host-to-device stalls
             
         Returns:
             TrainingResult with training metrics
         """
+        _require_tensorflow()
         self.class_names = class_names
         num_classes = len(class_names)
         
-        # Build model if not already built
+        # Build model if not already built; variables must be created in the strategy scope
         if self.model is None:
-            self.build_model(num_classes)
+            strategy = self.strategy or get_distribution_strategy()
+            with strategy.scope():
+                self.build_model(num_classes)
         
         # Callbacks
         callbacks = [
             EarlyStopping(
                 monitor='val_loss',
                 patience=self.config.early_stopping_patience,
+                min_delta=self.config.early_stopping_min_delta,
                 restore_best_weights=True
             ),
             ModelCheckpoint(
@@ -289,6 +664,9 @@ class ATKModelTrainer:
             )
         ]
         
+        if profile_dir:
+            callbacks.append(keras.callbacks.TensorBoard(log_dir=profile_dir, profile_batch=(10, 20)))
+        
         # Custom callback for progress
         if progress_callback:
             class ProgressCallback(keras.callbacks.Callback):
@@ -306,25 +684,33 @@ class ATKModelTrainer:
         
         self.history = history
         
-        # Get final metrics
+        # Convert history once (tolist() yields JSON-serializable Python floats).
+        # Report the epoch ModelCheckpoint saved (best val_accuracy), not the last one
+        history_dict = {
+            k: np.asarray(vals, dtype=np.float64).tolist() for k, vals in history.history.items()
+        }
+        best_epoch = int(np.argmax(history_dict['val_accuracy']))
         final_metrics = {
-            'accuracy': history.history['accuracy'][-1],
-            'val_accuracy': history.history['val_accuracy'][-1],
-            'loss': history.history['loss'][-1],
-            'val_loss': history.history['val_loss'][-1]
+            'accuracy': history_dict['accuracy'][best_epoch],
+            'val_accuracy': history_dict['val_accuracy'][best_epoch],
+            'loss': history_dict['loss'][best_epoch],
+            'val_loss': history_dict['val_loss'][best_epoch]
         }
         
+        # Shared by the metadata file and the result so both carry the same values
+        config_dict = asdict(self.config)
+        timestamp = datetime.now().isoformat()
+        
         # Save model metadata
         metadata = {
             'class_names': class_names,
-            'config': asdict(self.config),
+            'config': config_dict,
             'final_metrics': final_metrics,
-            'timestamp': datetime.now().isoformat()
+            'timestamp': timestamp
         }
         
         metadata_path = Path(model_save_path).with_suffix('.json')
-        with open(metadata_path, 'w') as f:
-            json.dump(metadata, f, indent=2)
+        metadata_path.write_bytes(_json_dumps(metadata))
         
         return TrainingResult(
             model_path=model_save_path,
@@ -334,17 +720,52 @@ class ATKModelTrainer:
             val_loss=final_metrics['val_loss'],
             epochs_trained=len(history.history['accuracy']),
             class_names=class_names,
-            config=asdict(self.config),
-            history={k: [float(v) for v in vals] for k, vals in history.history.items()},
-            timestamp=datetime.now().isoformat()
+            config=config_dict,
+            history=history_dict,
+            timestamp=timestamp
         )
 
 
+def _prepare_dataset_manager(
+    dataset_dir: str,
+    config: TrainingConfig,
+    dataset_options: Optional[Dict[str, Any]],
+    export_tfrecords: bool,
+    tfrecord_shard_size: int
+) -> DatasetManager:
+    """Create the DatasetManager, remove invalid images and (re-)export stale TFRecords."""
+    dataset_manager = DatasetManager(
+        dataset_dir,
+        img_size=(config.img_height, config.img_width),
+        **(dataset_options or {})
+    )
+    
+    # Validate and clean images
+    print("Validating images...")
+    stats = dataset_manager.validate_and_clean_images()
+    print(f"Valid: {stats['valid']}, Removed: {stats['removed']}")
+    if stats.get("invalid"):
+        print(f"Warning: {stats['invalid']} invalid image(s) could not be removed")
+    
+    if export_tfrecords and not dataset_manager.tfrecords_up_to_date():
+        print(f"Exporting TFRecords to {dataset_manager.tfrecord_dir}...")
+        counts = dataset_manager.export_tfrecords(shard_size=tfrecord_shard_size)
+        print(f"Train: {counts['train']}, Val: {counts['val']}")
+    
+    return dataset_manager
+
+
 def train_model_from_dataset(
     dataset_dir: str = "dataset_alat_tulis",
     model_save_path: str = "models/best_model.keras",
     config: Optional[TrainingConfig] = None,
-    progress_callback: Optional[Callable] = None
+    progress_callback: Optional[Callable] = None,
+    cache_dir: Optional[str] = None,
+    dataset_options: Optional[Dict[str, Any]] = None,
+    export_tfrecords: bool = False,
+    tfrecord_shard_size: int = 1024,
+    num_gpus: Optional[int] = None,
+    profile_dir: Optional[str] = None
 ) -> TrainingResult:
     """
     Complete training pipeline.
@@ -354,37 +775,48 @@ def train_model_from_dataset(
         model_save_path: Path to save trained model
         config: Training configuration
         progress_callback: Optional progress callback
+        cache_dir: Optional directory for the on-disk dataset cache
+        dataset_options: Extra DatasetManager arguments (input pipeline tuning)
+        export_tfrecords: (Re-)export TFRecords to dataset_options["tfrecord_dir"]
+            before training when missing or
+            older than the dataset, so training reads shards instead of images
+        tfrecord_shard_size: Images per TFRecord shard when exporting
+        num_gpus: Number of GPUs for data-parallel training (all visible if None)
+        profile_dir: Optional directory for a TensorBoard profiler trace
         
     Returns:
         TrainingResult with training metrics
     """
     config = config or TrainingConfig()
-    
-    # Initialize dataset manager
-    dataset_manager = DatasetManager(
+    dataset_manager = _prepare_dataset_manager(
         dataset_dir,
-        img_size=(config.img_height, config.img_width)
+        config,
+        {"cache_dir": cache_dir, **(dataset_options or {})},
+        export_tfrecords,
+        tfrecord_shard_size
     )
     
-    # Validate and clean images
-    print("Validating images...")
-    stats = dataset_manager.validate_and_clean_images()
-    print(f"Valid: {stats['valid']}, Removed: {stats['removed']}")
-    
-    # Load dataset
+    # Load dataset, batching for all replicas at once
     print("Loading dataset...")
-    train_ds, val_ds, class_names = dataset_manager.load_dataset()
+    strategy = get_distribution_strategy(num_gpus)
+    global_batch_size = config.batch_size * strategy.num_replicas_in_sync
+    if strategy.num_replicas_in_sync > 1 and dataset_manager.prefetch_to_device:
+        # The distributed dataset already stages each replica's batch on its device
+        print("Ignoring prefetch_to_device under MirroredStrategy")
+        dataset_manager.prefetch_to_device = None
+    train_ds, val_ds, class_names = dataset_manager.load_dataset(batch_size=global_batch_size)
     print(f"Classes: {class_names}")
     
     # Train model
-    print("Training model...")
-    trainer = ATKModelTrainer(config)
+    print(f"Training model on {strategy.num_replicas_in_sync} replica(s)...")
+    trainer = ATKModelTrainer(config, strategy=strategy)
     result = trainer.train(
         train_ds,
         val_ds,
         class_names,
         model_save_path,
-        progress_callback
+        progress_callback,
+        profile_dir=profile_dir
     )
     
     print(f"Training complete! Accuracy: {result.accuracy:.4f}, Val Accuracy: {result.val_accuracy:.4f}")
@@ -392,9 +824,313 @@ def train_model_from_dataset(
     return result
 
 
+def tune_hyperparameters(
+    dataset_dir: str = "dataset_alat_tulis",
+    model_save_path: str = "models/best_model.keras",
+    base_config: Optional[TrainingConfig] = None,
+    n_trials: int = 10,
+    parallel_trials: int = 1,
+    tuning_dir: str = "models/tuning",
+    dataset_options: Optional[Dict[str, Any]] = None,
+    search: str = "bayes",
+    warmup_trials: int = 5,
+    resume: bool = False,
+    num_gpus: Optional[int] = None,
+    export_tfrecords: bool = False,
+    tfrecord_shard_size: int = 1024
+) -> Tuple[TrainingConfig, float]:
+    """
+    Search learning rate, layer sizes and dropout with Optuna, maximizing
+    val_accuracy. The dataset is validated, exported (optionally) and loaded
+    once as in train_model_from_dataset, then shared by all trials; up to
+    parallel_trials trials train concurrently (threads - TensorFlow releases
+    the GIL inside its kernels). With GPUs, each running trial is pinned to a
+    GPU of its own, so parallel_trials may not exceed the number of GPUs. The
+    best trial's model and metadata are copied to model_save_path.
+    
+    The study is stored in tuning_dir/study.db, so a resumed search keeps the
+    finished trials, warm-starts the sampler from them and only runs the
+    trials still missing from n_trials.
+    
+    Args:
+        dataset_dir: Path to dataset directory
+        model_save_path: Where to copy the best trial's model
+        base_config: Configuration for everything that is not searched
+        n_trials: Number of trials
+        parallel_trials: Number of trials run at the same time
+        tuning_dir: Directory for per-trial checkpoints and the study database
+        dataset_options: Extra DatasetManager arguments (input pipeline tuning)
+        search: "random", "bayes" (TPE) or "hyperband" (TPE plus Hyperband
+            pruning of trials whose per-epoch val_accuracy falls behind)
+        warmup_trials: Random trials before TPE starts modelling the search space
+        resume: Continue the study saved in tuning_dir instead of starting over
+        num_gpus: Number of GPUs trials are spread over (all visible if None)
+        export_tfrecords: (Re-)export TFRecords to dataset_options["tfrecord_dir"]
+            before tuning when missing or older than the dataset
+        tfrecord_shard_size: Images per TFRecord shard when exporting
+        
+    Returns:
+        Tuple of (best TrainingConfig, best val_accuracy)
+    """
+    if not OPTUNA_AVAILABLE:
+        raise RuntimeError("Optuna not available. Install with: pip install optuna")
+    import optuna
+    
+    base_config = base_config or TrainingConfig()
+    if parallel_trials > 1 and (dataset_options or {}).get("cache_dir"):
+        # Concurrent iterators over one file cache collide on its lock file
+        raise ValueError("A file cache (cache_dir) cannot be shared by parallel trials; use the in-memory cache")
+    
+    _require_tensorflow()
+    available = len(tf.config.list_physical_devices('GPU'))
+    gpus = [f"/gpu:{i}" for i in range(available if num_gpus is None else min(num_gpus, available))]
+    if gpus and parallel_trials > len(gpus):
+        raise ValueError(f"parallel_trials={parallel_trials} exceeds the {len(gpus)} available GPU(s)")
+    free_devices = queue.Queue()
+    for device in gpus:
+        free_devices.put(device)
+    
+    dataset_manager = _prepare_dataset_manager(
+        dataset_dir, base_config, dataset_options, export_tfrecords, tfrecord_shard_size
+    )
+    if parallel_trials > 1 and dataset_manager.prefetch_to_device:
+        # Trials run on different GPUs; staging every batch on one of them would be wrong
+        print("Ignoring prefetch_to_device with parallel trials")
+        dataset_manager.prefetch_to_device = None
+    # Each trial trains on a single device, so the per-replica batch size is the batch size
+    train_ds, val_ds, class_names = dataset_manager.load_dataset(batch_size=base_config.batch_size)
+    
+    tuning_path = Path(tuning_dir)
+    tuning_path.mkdir(parents=True, exist_ok=True)
+    
+    def objective(trial) -> float:
+        config = replace(
+            base_config,
+            learning_rate=trial.suggest_float("learning_rate", 1e-4, 1e-2, log=True),
+            conv1_filters=trial.suggest_categorical("conv1_filters", [16, 32, 64]),
+            conv2_filters=trial.suggest_categorical("conv2_filters", [32, 64, 128]),
+            conv3_filters=trial.suggest_categorical("conv3_filters", [64, 128, 256]),
+            dense_units=trial.suggest_categorical("dense_units", [64, 128, 256]),
+            dropout_rate=trial.suggest_float("dropout_rate", 0.2, 0.6)
+        )
+        def report_epoch(epoch, logs):
+            trial.report(logs['val_accuracy'], epoch)
+            if trial.should_prune():
+                raise optuna.TrialPruned()
+        
+        # One GPU per running trial (default single-device strategy without GPUs)
+        device = free_devices.get() if gpus else None
+        try:
+            strategy = tf.distribute.OneDeviceStrategy(device) if device else tf.distribute.get_strategy()
+            result = ATKModelTrainer(config, strategy=strategy).train(
+                train_ds, val_ds, class_names, str(tuning_path / f"trial_{trial.number}.keras"),
+                progress_callback=report_epoch
+            )
+        finally:
+            if device:
+                free_devices.put(device)
+        # Metrics of the checkpointed (best val_accuracy) epoch
+        return result.val_accuracy
+    
+    if search == "random":
+        sampler = optuna.samplers.RandomSampler()
+    else:
+        sampler = optuna.samplers.TPESampler(n_startup_trials=warmup_trials)
+    pruner = optuna.pruners.HyperbandPruner() if search == "hyperband" else optuna.pruners.NopPruner()
+    
+    study_db = tuning_path / "study.db"
+    if not resume:
+        study_db.unlink(missing_ok=True)
+    study = optuna.create_study(
+        study_name="atk",
+        storage=f"sqlite:///{study_db}",
+        load_if_exists=True,
+        direction="maximize",
+        sampler=sampler,
+        pruner=pruner
+    )
+    finished = len(study.get_trials(states=(optuna.trial.TrialState.COMPLETE, optuna.trial.TrialState.PRUNED)))
+    if finished:
+        print(f"Resuming study with {finished} finished trial(s)")
+    if n_trials > finished:
+        study.optimize(objective, n_trials=n_trials - finished, n_jobs=parallel_trials)
+    
+    if not study.get_trials(states=(optuna.trial.TrialState.COMPLETE,)):
+        raise RuntimeError("No tuning trial completed (all were pruned or failed)")
+    
+    best_model = tuning_path / f"trial_{study.best_trial.number}.keras"
+    shutil.copy(best_model, model_save_path)
+    shutil.copy(best_model.with_suffix('.json'), Path(model_save_path).with_suffix('.json'))
+    print(f"Best trial {study.best_trial.number}: val_accuracy={study.best_value:.4f} {study.best_params}")
+    
+    return replace(base_config, **study.best_params), study.best_value
+
+
+@lru_cache(maxsize=None)
+def build_arg_parser() -> argparse.ArgumentParser:
+    """Build the command-line parser for training (once; main() may be called repeatedly)."""
+    parser = argparse.ArgumentParser(description="Train the ATK classifier")
+    parser.add_argument("--dataset-dir", default="dataset_alat_tulis", help="Dataset directory (one subdirectory per class)")
+    parser.add_argument("--model-path", default="models/best_model.keras", help="Where to save the trained model")
+    parser.add_argument(
+        "--jit", action=argparse.BooleanOptionalAction, default=True,
+        help="XLA-compile the training step (batch and image size are fixed, so it compiles once)"
+    )
+    
+    parser.add_argument(
+        "--steps-per-execution", type=int, default=1,
+        help="Training steps per compiled call (8-32 cuts per-step Python overhead; coarser progress updates)"
+    )
+    parser.add_argument(
+        "--batch-norm", action="store_true",
+        help="BatchNormalization after each conv (folded into the conv weights at inference)"
+    )
+    parser.add_argument("--epochs", type=int, default=15, help="Maximum number of epochs")
+    parser.add_argument("--batch-size", type=int, default=15, help="Batch size per GPU replica")
+    parser.add_argument("--gpus", type=int, default=None, help="GPUs for data-parallel training (default: all visible)")
+    parser.add_argument(
+        "--gpu-memory-limit", type=int, default=None, metavar="MB",
+        help="Cap memory allocated on each GPU (default: grow on demand)"
+    )
+    parser.add_argument("--patience", type=int, default=3, help="Epochs without val_loss improvement before stopping")
+    parser.add_argument("--min-delta", type=float, default=0.0, help="Smallest val_loss drop that counts as improvement")
+    parser.add_argument(
+        "--mixed-precision", choices=list(PRECISION_POLICIES), default="off",
+        help="Compute in float16 (GPU) or bfloat16 (TPU/Ampere+) with float32 variables"
+    )
+    
+    parser.add_argument(
+        "--profile-dir", default=None,
+        help="Write a TensorBoard profiler trace of training steps 10-20 here (view with tensorboard --logdir; not with --tune)"
+    )
+    
+    tuning = parser.add_argument_group("hyperparameter tuning (requires optuna)")
+    tuning.add_argument("--tune", action="store_true", help="Search hyperparameters instead of a single training run")
+    tuning.add_argument("--trials", type=int, default=10, help="Number of tuning trials")
+    tuning.add_argument(
+        "--parallel-trials", type=int, default=1,
+        help="Trials trained concurrently (one GPU each; at most the number of GPUs)"
+    )
+    tuning.add_argument(
+        "--tuning-dir", default="models/tuning", help="Directory for per-trial checkpoints and the study database"
+    )
+    tuning.add_argument(
+        "--resume-tuning", action="store_true",
+        help="Continue the study in --tuning-dir, running only the trials still missing from --trials"
+    )
+    tuning.add_argument(
+        "--search", choices=["random", "bayes", "hyperband"], default="bayes",
+        help="Search algorithm: random, Bayesian (TPE), or TPE with Hyperband pruning"
+    )
+    tuning.add_argument("--warmup-trials", type=int, default=5, help="Random trials before Bayesian search starts")
+    
+    pipeline = parser.add_argument_group("input pipeline (-1 = AUTOTUNE)")
+    pipeline.add_argument(
+        "--cache", default="mem", metavar="{none,mem,PATH}",
+        help="Cache decoded batches in memory (mem), on disk under PATH (e.g. /dev/shm/atk_cache), or not at all"
+    )
+    pipeline.add_argument("--prefetch", type=int, default=AUTOTUNE, help="Batches to prefetch")
+    pipeline.add_argument("--num-parallel-calls", type=int, default=AUTOTUNE, help="Parallel parse/read calls")
+    pipeline.add_argument("--interleave-cycle", type=int, default=8, help="TFRecord shards read concurrently")
+    pipeline.add_argument(
+        "--prefetch-to-device", nargs="?", const="/gpu:0", default=None, metavar="DEVICE",
+        help="Stage batches on DEVICE (default /gpu:0) ahead of the training step"
+    )
+    pipeline.add_argument("--device-buffer", type=int, default=2, help="Batches staged on the device")
+    pipeline.add_argument(
+        "--fast-jpeg", action="store_true",
+        help="Decode TFRecord JPEGs with the faster integer DCT (slightly less accurate)"
+    )
+    pipeline.add_argument(
+        "--deterministic", action=argparse.BooleanOptionalAction, default=False,
+        help="Keep input order across parallel reads and maps (reproducible, slower)"
+    )
+    pipeline.add_argument(
+        "--resize-method", choices=["bilinear", "nearest", "bicubic", "area"], default="bilinear",
+        help="Interpolation when resizing images (nearest is fastest)"
+    )
+    pipeline.add_argument(
+        "--tfrecord-dir", default=None,
+        help="Export the dataset to TFRecord shards here (when missing or stale) and train from them"
+    )
+    pipeline.add_argument("--tfrecord-shard-size", type=int, default=1024, help="Images per TFRecord shard")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Run training from the command line."""
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    if not Path(args.dataset_dir).is_dir():
+        parser.error(f"dataset directory not found: {args.dataset_dir}")
+    if args.tune and args.profile_dir:
+        parser.error("--profile-dir profiles a single training run and cannot be used with --tune")
+    if args.gpu_memory_limit:
+        limit_gpu_memory(args.gpu_memory_limit)
+    
+    config = TrainingConfig(
+        epochs=args.epochs,
+        batch_size=args.batch_size,
+        early_stopping_patience=args.patience,
+        early_stopping_min_delta=args.min_delta,
+        jit_compile=args.jit,
+        steps_per_execution=args.steps_per_execution,
+        mixed_precision=args.mixed_precision,
+        batch_norm=args.batch_norm
+    )
+    dataset_options = {
+        "prefetch_buffer": args.prefetch,
+        "num_parallel_calls": args.num_parallel_calls,
+        "interleave_cycle": args.interleave_cycle,
+        "prefetch_to_device": args.prefetch_to_device,
+        "device_buffer": args.device_buffer,
+        "fast_jpeg": args.fast_jpeg,
+        "deterministic": args.deterministic,
+        "resize_method": args.resize_method
+    }
+    
+    if args.cache == "none":
+        dataset_options["cache"] = False
+    elif args.cache != "mem":
+        dataset_options["cache_dir"] = args.cache
+    if args.tfrecord_dir:
+        dataset_options["tfrecord_dir"] = args.tfrecord_dir
+    
+    if args.tune:
+        best_config, best_val_accuracy = tune_hyperparameters(
+            args.dataset_dir,
+            args.model_path,
+            config,
+            n_trials=args.trials,
+            parallel_trials=args.parallel_trials,
+            tuning_dir=args.tuning_dir,
+            dataset_options=dataset_options,
+            search=args.search,
+            warmup_trials=args.warmup_trials,
+            resume=args.resume_tuning,
+            num_gpus=args.gpus,
+            export_tfrecords=bool(args.tfrecord_dir),
+            tfrecord_shard_size=args.tfrecord_shard_size
+        )
+        print(f"\nBest model saved to: {args.model_path} (val_accuracy={best_val_accuracy:.4f})")
+        return
+    
+    result = train_model_from_dataset(
+        args.dataset_dir,
+        args.model_path,
+        config,
+        dataset_options=dataset_options,
+        export_tfrecords=bool(args.tfrecord_dir),
+        tfrecord_shard_size=args.tfrecord_shard_size,
+        num_gpus=args.gpus,
+        profile_dir=args.profile_dir
+    )
+    print("\n".join([
+        f"\nModel saved to: {result.model_path}",
+        f"Final accuracy: {result.accuracy:.4f}",
+        f"Final val_accuracy: {result.val_accuracy:.4f}"
+    ]))
+
+
 if __name__ == "__main__":
-    # Run training from command line
-    result = train_model_from_dataset()
-    print(f"\nModel saved to: {result.model_path}")
-    print(f"Final accuracy: {result.accuracy:.4f}")
-    print(f"Final val_accuracy: {result.val_accuracy:.4f}")
+    main()
@@ -88,6 +88,19 @@ class TestNormalizationRange:
             f"Found values below 0.0: min={result.min()}"
         assert np.all(result <= 255.0), \
             f"Found values above 255.0: max={result.max()}"
+    
+    @given(image=random_image())
+    @settings(max_examples=50)
+    def test_unnormalized_output_is_uint8(self, image):
+        """
+        For models with Rescaling layer (normalize=False), the output SHALL
+        stay uint8 so no float conversion happens before the model.
+        """
+        preprocessor = ImagePreprocessor(input_size=(224, 224), normalize=False)
+        result = preprocessor.preprocess(image)
+        
+        assert result.dtype == np.uint8
+        assert result.shape == (1, 224, 224, 3)
 
 
 # **Feature: atk-classifier-mlops, Property 8: RGB Channel Count**